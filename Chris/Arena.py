@@ -1,7 +1,10 @@
 import logging
 
+import numpy as np
 from tqdm import tqdm
 
+from MCTS import MCTS
+
 log = logging.getLogger(__name__)
 
 
@@ -10,7 +13,7 @@ class Arena():
     An Arena class where any 2 agents can be pit against each other.
     """
 
-    def __init__(self, player1, player2, game, display=None):
+    def __init__(self, player1, player2, game, display=None, gameEnded=None):
         """
         Input:
             player 1,2: two functions that takes board as input, return action
@@ -18,6 +21,8 @@ class Arena():
             display: a function that takes board as input and prints it (e.g.
                      display in othello/OthelloGame). Is necessary for verbose
                      mode.
+            gameEnded: replaces game.getGameEnded to decide when a game is
+                       over, e.g. game.getGameEndedVC
 
         see othello/OthelloPlayers.py for an example. See pit.py for pitting
         human players/other baselines with each other.
@@ -26,6 +31,7 @@ class Arena():
         self.player2 = player2
         self.game = game
         self.display = display
+        self.gameEnded = gameEnded or game.getGameEnded
 
     def playGame(self, verbose=False):
         """
@@ -41,7 +47,7 @@ class Arena():
         curPlayer = 1
         board = self.game.getInitBoard()
         it = 0
-        while self.game.getGameEnded(board, curPlayer) == 0:
+        while self.gameEnded(board, curPlayer) == 0:
             it += 1
             if verbose:
                 assert self.display
@@ -58,9 +64,9 @@ class Arena():
             board, curPlayer = self.game.getNextState(self.game.getCanonicalForm(board, curPlayer), curPlayer, action)#TODO take canonicalBoard instead
         if verbose:
             assert self.display
-            print("Game over: Turn ", str(it), "Result ", str(self.game.getGameEnded(board, 1)))
+            print("Game over: Turn ", str(it), "Result ", str(self.gameEnded(board, 1)))
             self.display(board)
-        return curPlayer * self.game.getGameEnded(board, curPlayer)
+        return curPlayer * self.gameEnded(board, curPlayer)
 
     def playGames(self, num, verbose=False):
         """
@@ -97,4 +103,190 @@ class Arena():
             else:
                 draws += 1
 
-        return oneWon, twoWon, draws
\ No newline at end of file
+        return oneWon, twoWon, draws
+
+    def playGamesSequential(self, num, stop=None, verbose=False):
+        """
+        Plays up to num games, alternating which player starts. After every
+        game stop(oneWon, twoWon, draws) is called, and no more games are
+        played once it returns True.
+
+        Returns:
+            oneWon: games won by player1
+            twoWon: games won by player2
+            draws:  games won by nobody
+        """
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        for k in tqdm(range(num), desc="Arena.playGamesSequential"):
+            if k % 2 == 0:
+                gameResult = self.playGame(verbose=verbose)
+            else:
+                self.player1, self.player2 = self.player2, self.player1
+                gameResult = -self.playGame(verbose=verbose)
+                self.player1, self.player2 = self.player2, self.player1
+            if gameResult == 1:
+                oneWon += 1
+            elif gameResult == -1:
+                twoWon += 1
+            else:
+                draws += 1
+
+            if stop is not None and stop(oneWon, twoWon, draws):
+                break
+
+        return oneWon, twoWon, draws
+
+
+class BatchedArena():
+    """
+    An Arena where 2 agents are pit against each other in many games at once.
+    An agent is either a network or a play function as in Arena. Networks
+    play with MCTS, or straight from their policy when args.numMCTSSims is 0.
+
+    The games advance in lockstep: every step runs one simulation in each
+    game, and the boards that need a network evaluation are evaluated with
+    one predict_batch call per network.
+    """
+
+    def __init__(self, player1, player2, game, args, numParallel=8, display=None):
+        """
+        Input:
+            player 1,2: networks, each played with MCTS(game, nnet, args) and
+                        temp=0 with a fresh search tree per game (or with the
+                        raw policy if args.numMCTSSims is 0), or functions that
+                        take the canonical board and player, return action
+            game: Game object
+            args: MCTS args (numMCTSSims, cpuct, ...), with vcTermination
+                  games end once they are decided by virtual connections
+            numParallel: number of games played at the same time
+            display: a function that takes board as input and prints it. Is
+                     necessary for verbose mode.
+        """
+        self.players = [player1, player2]
+        self.game = game
+        self.args = args
+        self.numParallel = numParallel
+        self.display = display
+        self.gameEnded = game.getGameEnded
+        if args.get('vcTermination', False) and hasattr(game, 'getGameEndedVC'):
+            self.gameEnded = game.getGameEndedVC
+
+    def newGame(self, first):
+        """
+        Starts a game in which player index first (0 or 1) is player 1.
+        """
+        board = self.game.getInitBoard()
+        return {'board': board, 'curPlayer': 1, 'first': first, 'sims': 0, 'it': 0,
+                'mcts': [None if callable(p) else MCTS(self.game, p, self.args) for p in self.players],
+                'canonical': self.game.getCanonicalForm(board, 1)}
+
+    def playGames(self, num, verbose=False, stop=None):
+        """
+        Plays num games in which player1 starts num/2 games and player2 starts
+        num/2 games. After every finished game stop(oneWon, twoWon, draws) is
+        called if given, and the games still running are abandoned once it
+        returns True.
+
+        Returns:
+            oneWon: games won by player1
+            twoWon: games won by player2
+            draws:  games won by nobody
+        """
+        num = int(num / 2)
+        queue = [0, 1] * num  # index of the player that plays first
+        results = [0, 0, 0]  # wins of player1, wins of player2, draws
+        active = []
+
+        with tqdm(total=len(queue), desc="BatchedArena.playGames") as progress:
+            while queue or active:
+                while queue and len(active) < self.numParallel:
+                    active.append(self.newGame(queue.pop(0)))
+
+                # one step in every game, collecting the boards to evaluate per network
+                moves = []
+                requests = [[], []]
+                policies = [[], []]
+                for g in active:
+                    side = self.toMove(g)
+                    mcts = g['mcts'][side]
+                    if mcts is None:
+                        moves.append((g, self.players[side](np.copy(g['canonical']), g['curPlayer'])))
+                    elif self.args.numMCTSSims == 0:
+                        policies[side].append(g)
+                    else:
+                        path, leaf, v = mcts.selectLeaf(np.copy(g['canonical']), g['curPlayer'])
+                        if leaf is None:
+                            mcts.backup(path, v)
+                        else:
+                            requests[side].append((mcts, path, leaf))
+                        g['sims'] += 1
+
+                for side in range(2):
+                    if requests[side]:
+                        pis, vs = self.players[side].predict_batch([leaf[1] for _, _, leaf in requests[side]])
+                        for (mcts, path, leaf), pi, v in zip(requests[side], pis, vs):
+                            mcts.backup(path, mcts.expandLeaf(leaf, pi, v))
+                    if policies[side]:
+                        pis, _ = self.players[side].predict_batch([g['canonical'] for g in policies[side]])
+                        for g, pi in zip(policies[side], pis):
+                            valids = self.game.getValidMoves(g['canonical'], g['curPlayer'])
+                            moves.append((g, np.argmax(np.where(valids, pi, -1))))
+
+                # games that finished their search make a move
+                for g in active:
+                    mcts = g['mcts'][self.toMove(g)]
+                    if mcts is not None and self.args.numMCTSSims > 0 and g['sims'] >= self.args.numMCTSSims:
+                        moves.append((g, np.argmax(mcts.getVisitProb(g['canonical'], g['curPlayer'], temp=0))))
+
+                for g, action in moves:
+                    result = self.makeMove(g, action, verbose)
+                    if result is None:
+                        continue
+                    active.remove(g)
+                    progress.update(1)
+                    if result == 1:
+                        results[g['first']] += 1
+                    elif result == -1:
+                        results[1 - g['first']] += 1
+                    else:
+                        results[2] += 1
+
+                    if stop is not None and stop(*results):
+                        return tuple(results)
+
+        return tuple(results)
+
+    def toMove(self, g):
+        """index of the player to move in game g"""
+        return g['first'] if g['curPlayer'] == 1 else 1 - g['first']
+
+    def makeMove(self, g, action, verbose=False):
+        """
+        Plays action in game g.
+
+        Returns:
+            None if the game goes on, else the result as in Arena.playGame
+            (1 if player 1 won, -1 if player 2 won)
+        """
+        curPlayer, canonical = g['curPlayer'], g['canonical']
+
+        valids = self.game.getValidMoves(canonical, curPlayer)
+        if valids[action] == 0:
+            log.error(f'Action {action} is not valid!')
+            log.debug(f'valids = {valids}')
+            assert valids[action] > 0
+        g['board'], g['curPlayer'] = self.game.getNextState(np.copy(canonical), curPlayer, action)
+        g['canonical'] = self.game.getCanonicalForm(g['board'], g['curPlayer'])
+        g['sims'] = 0
+        g['it'] += 1
+
+        ended = self.gameEnded(g['board'], g['curPlayer'])
+        if ended == 0:
+            return None
+        if verbose:
+            assert self.display
+            print("Game over: Turn ", str(g['it']), "Result ", str(self.gameEnded(g['board'], 1)))
+            self.display(g['board'])
+        return g['curPlayer'] * ended
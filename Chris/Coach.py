@@ -5,12 +5,15 @@ from collections import deque
 from pickle import Pickler, Unpickler
 from random import shuffle
 
-from hex.HexPlayers import RandomPlayer
 import numpy as np
 from tqdm import tqdm
 
-from Arena import Arena
+from Arena import Arena, BatchedArena
+from Evaluation import EvaluationSuite
 from MCTS import MCTS
+from Profiler import Profiler
+from SPRT import SPRT, scoreToElo
+from hex.OpeningBook import load_book
 
 import time
 log = logging.getLogger(__name__)
@@ -27,9 +30,18 @@ class Coach():
         self.nnet = nnet
         self.pnet = self.nnet.__class__(self.game)  # the competitor network
         self.args = args
-        self.mcts = MCTS(self.game, self.nnet, self.args)
+        self.profiler = Profiler() if self.args.get('profile', False) else None  # self-play timings, see args.profileFile
+        self.nnet.profiler = self.profiler
+        self.mcts = MCTS(self.game, self.nnet, self.args, self.profiler)
+        self.evaluation = EvaluationSuite(self.game, self.args)
         self.trainExamplesHistory = []  # history of examples from args.numItersForTrainExamplesHistory latest iterations
         self.skipFirstSelfPlay = False  # can be overriden in loadTrainExamples()
+        self.resignThreshold = self.args.get('resignThreshold', None)  # None disables resignation
+        self.book = load_book(self.args.get('openingBook', None))  # book positions are played without a search
+        self.gameEnded = game.getGameEnded
+        if self.args.get('vcTermination', False) and hasattr(game, 'getGameEndedVC'):
+            self.gameEnded = game.getGameEndedVC  # games end once a virtual connection decides them
+        self.resetResignStats()
 
     def executeEpisode(self):
         """
@@ -42,15 +54,33 @@ class Coach():
         It uses a temp=1 if episodeStep < tempThreshold, and thereafter
         uses temp=0.
 
+        If resignation is enabled, the player to move resigns once the MCTS
+        root value drops below resignThreshold. In a resignDisabledFrac
+        fraction of games resignation is switched off and the game is played
+        out, to count how often a resignation would have been wrong.
+
+        With args.playoutCap (playout cap randomization) only a fullSearchProb
+        fraction of the moves gets the full numMCTSSims search, the others use
+        fastMCTSSims simulations. All positions keep their value target, but
+        only fully searched ones are flagged as policy targets.
+
+        Positions in the opening book (args.openingBook) take their policy from
+        the book visits instead of a search.
+
         Returns:
-            trainExamples: a list of examples of the form (canonicalBoard, currPlayer, pi,v)
+            trainExamples: a list of examples of the form (canonicalBoard, pi, v, isFullSearch)
                            pi is the MCTS informed policy vector, v is +1 if
                            the player eventually won the game, else -1.
+                           isFullSearch is False if pi came from a fast search
+                           and should not be used as a policy target.
         """
         trainExamples = []
         board = self.game.getInitBoard()
         self.curPlayer = 1
         episodeStep = 0
+        canResign = self.resignThreshold is not None and \
+            np.random.rand() >= self.args.get('resignDisabledFrac', 0.1)
+        wouldResign = set()  # players whose root value dropped below the threshold while resigning was disabled
 
         while True:
             episodeStep += 1
@@ -58,17 +88,67 @@ class Coach():
             originalBoard = np.copy(canonicalBoard)
             temp = int(episodeStep < self.args.tempThreshold)
 
-            pi = self.mcts.getActionProb(canonicalBoard, player=self.curPlayer, temp=temp)
+            fullSearch = not self.args.get('playoutCap', False) or np.random.rand() < self.args.fullSearchProb
+            numSims = self.args.numMCTSSims if fullSearch else self.args.fastMCTSSims
+
+            pi = self.book.probs(self.game, canonicalBoard, temp) if self.book is not None else None
+            if pi is None:
+                if self.profiler is not None:
+                    moveStart = self.profiler.snapshot()
+                pi = self.mcts.getActionProb(canonicalBoard, player=self.curPlayer, temp=temp, numSims=numSims)
+                if self.profiler is not None:
+                    self.profiler.dump(self.args.profileFile, since=moveStart, kind='move', step=episodeStep, sims=numSims)
+            else:
+                fullSearch = True  # the book policy comes from a deep search
             sym = self.game.getSymmetries(canonicalBoard, pi)
             for b, p in sym:
-                trainExamples.append([b, self.curPlayer, p, None])
+                trainExamples.append([b, self.curPlayer, p, None, fullSearch])
+
+            if self.resignThreshold is not None and \
+                    self.mcts.getRootValue(canonicalBoard, self.curPlayer) < self.resignThreshold:
+                if canResign:
+                    self.resignStats['resigned'] += 1
+                    return self.assignOutcome(trainExamples, -1)  # the player to move loses
+                wouldResign.add(self.curPlayer)
 
             action = np.random.choice(len(pi), p=pi)
             board, self.curPlayer = self.game.getNextState(originalBoard, self.curPlayer, action)
-            r = self.game.getGameEnded(board, self.curPlayer)
+            r = self.gameEnded(board, self.curPlayer)
 
             if r != 0:
-                return [(x[0], x[2], r * ((-1) ** (x[1] != self.curPlayer))) for x in trainExamples]
+                if self.resignThreshold is not None and not canResign:
+                    winner = self.curPlayer if r == 1 else -self.curPlayer
+                    self.resignStats['disabledGames'] += 1
+                    self.resignStats['wouldResign'] += len(wouldResign)
+                    self.resignStats['falseResigns'] += int(winner in wouldResign)
+                return self.assignOutcome(trainExamples, r)
+
+    def assignOutcome(self, trainExamples, r):
+        """
+        Labels the examples of an episode with the outcome r, given from the
+        point of view of self.curPlayer.
+        """
+        return [(x[0], x[2], r * ((-1) ** (x[1] != self.curPlayer)), x[4]) for x in trainExamples]
+
+    def resetResignStats(self):
+        self.resignStats = {'resigned': 0, 'disabledGames': 0, 'wouldResign': 0, 'falseResigns': 0}
+
+    def checkResignations(self):
+        """
+        Logs the false positive rate of resignation measured in the games where
+        it was disabled, and makes the threshold stricter when the rate is above
+        args.resignFalsePositiveTarget.
+        """
+        stats = self.resignStats
+        self.resetResignStats()
+        if self.resignThreshold is None or stats['wouldResign'] == 0:
+            return
+        rate = stats['falseResigns'] / stats['wouldResign']
+        log.info(f"RESIGNED : {stats['resigned']} ; FALSE RESIGNS : {stats['falseResigns']} / {stats['wouldResign']} "
+                 f"({rate:.2%}) in {stats['disabledGames']} played out games ; THRESHOLD : {self.resignThreshold:.2f}")
+        if rate > self.args.get('resignFalsePositiveTarget', 0.05):
+            self.resignThreshold = max(self.resignThreshold - 0.05, -1.0)
+            log.info(f'Lowering resign threshold to {self.resignThreshold:.2f}')
 
     def learn(self):
         """
@@ -79,8 +159,13 @@ class Coach():
         only if it wins >= updateThreshold fraction of games.
         """
 
-        f = open("evaluation_random.csv",  "w")
-        f.close()
+        self.evaluation.reset()
+        if self.args.get('sprt', False):
+            f = open("evaluation_gate.csv",  "w")
+            f.close()
+        if self.profiler is not None:
+            f = open(self.args.profileFile, "w")  # one training run per profile file
+            f.close()
 
         for i in range(1, self.args.numIters + 1):
             # bookkeeping
@@ -89,9 +174,17 @@ class Coach():
             if not self.skipFirstSelfPlay or i > 1:
                 iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
 
+                selfPlayNet = self.getSelfPlayNet()
+                if self.profiler is not None:
+                    iterationStart = self.profiler.snapshot()
                 for _ in tqdm(range(self.args.numEps), desc="Self Play"):
-                    self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
+                    self.mcts = MCTS(self.game, selfPlayNet, self.args, self.profiler)  # reset search tree
                     iterationTrainExamples += self.executeEpisode()
+                if self.profiler is not None:
+                    self.profiler.dump(self.args.profileFile, since=iterationStart, kind='iteration', iteration=i,
+                                       episodes=self.args.numEps)
+
+                self.checkResignations()
 
                 # save the iteration examples to the history 
                 self.trainExamplesHistory.append(iterationTrainExamples)
@@ -111,8 +204,8 @@ class Coach():
             shuffle(trainExamples)
 
             # training new network, keeping a copy of the old one
-            self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp')
-            self.pnet.load_checkpoint(folder=self.args.checkpoint, filename='temp')
+            self.pnet.set_weights(self.nnet.get_weights())
+            self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp')  # in the background, A0_Player loads it
             pmcts = MCTS(self.game, self.pnet, self.args)
 
             self.nnet.train(trainExamples)
@@ -125,28 +218,76 @@ class Coach():
             # pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
             
             # # TODO different arena settings
-            arena = Arena(lambda x, player: np.argmax(pmcts.getActionProb(x, temp=0, player=player)),
-                          lambda x, player: np.argmax(nmcts.getActionProb(x, temp=0, player=player)), self.game, self.game.display)
-            pwins, nwins, draws = arena.playGames(self.args.arenaCompare, verbose=False)
+            sprt = self.getSPRT()
+            stop = (lambda p, n, d: sprt.status(n, p, d) is not None) if sprt else None
+            if self.args.get('arenaParallel', 1) > 1:
+                # lockstep games with batched network evaluations (a fresh tree per game)
+                arena = BatchedArena(self.pnet, self.nnet, self.game, self.args, self.args.arenaParallel, self.game.display)
+                pwins, nwins, draws = arena.playGames(self.args.arenaCompare, verbose=False, stop=stop)
+            else:
+                arena = Arena(lambda x, player: np.argmax(pmcts.getActionProb(x, temp=0, player=player)),
+                              lambda x, player: np.argmax(nmcts.getActionProb(x, temp=0, player=player)), self.game, self.game.display,
+                              self.gameEnded)
+                if sprt:
+                    pwins, nwins, draws = arena.playGamesSequential(self.args.arenaCompare, stop=stop, verbose=False)
+                else:
+                    pwins, nwins, draws = arena.playGames(self.args.arenaCompare, verbose=False)
 
             # evaluation vs random
-            arena = Arena(RandomPlayer(self.game).play,
-                          lambda x, player: np.argmax(nmcts.getActionProb(x, temp=0, player=player)), self.game, self.game.display)
-            pwins2, nwins2, draws2 = arena.playGames(self.args.arenaCompare, verbose=False)
-
-            with open("evaluation_random.csv",  "a") as f:
-                f.write(f"{i},{pwins2},{nwins2},{draws2}\n")
+            self.evaluation.run(self.nnet, nmcts, i)
 
             log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
-            if pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args.updateThreshold:
+            accept = pwins + nwins > 0 and float(nwins) / (pwins + nwins) >= self.args.updateThreshold
+            if sprt:
+                llr, decision = sprt.llr(nwins, pwins, draws), sprt.status(nwins, pwins, draws)
+                log.info(f'SPRT : {decision or "undecided"} after {pwins + nwins + draws} games, LLR {llr:.2f} '
+                         f'in [{sprt.lower:.2f}, {sprt.upper:.2f}]')
+                with open("evaluation_gate.csv",  "a") as f:
+                    f.write(f"{i},{pwins},{nwins},{draws},{llr:.3f},{decision or ''}\n")
+                if decision is not None:
+                    accept = decision == 'H1'  # otherwise fall back to updateThreshold
+
+            if not accept:
                 log.info('REJECTING NEW MODEL')
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
-                self.nnet.load_checkpoint(folder=self.args.checkpoint, filename='temp')
+                self.nnet.set_weights(self.pnet.get_weights())
             else:
                 log.info('ACCEPTING NEW MODEL')
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best')
 
+        self.nnet.wait_for_checkpoints()
+
+    def getSelfPlayNet(self):
+        """
+        Returns the network used for self-play: nnet itself, or an int8 copy of
+        it when args.quantizeSelfPlay is set. The copy is calibrated on boards
+        sampled from the replay history, so the first iteration stays float.
+        """
+        if not self.args.get('quantizeSelfPlay', False) or len(self.trainExamplesHistory) == 0:
+            return self.nnet
+
+        boards = [e[0] for examples in self.trainExamplesHistory for e in examples]
+        n = min(len(boards), self.args.get('quantizeCalibrationSize', 256))
+        boards = [boards[j] for j in np.random.choice(len(boards), n, replace=False)]
+        qnet = self.nnet.quantize(boards)
+        log.info(f'QUANTIZED SELF-PLAY NET AGREEMENT : {qnet.agreement(self.nnet, boards)}')
+        return qnet
+
+    def getSPRT(self):
+        """
+        Returns the SPRT used to gate the new network when args.sprt is set,
+        else None. By default H0 is "no stronger" (elo0 = 0) and H1 is "as
+        strong as updateThreshold" (the elo of that score).
+        """
+        if not self.args.get('sprt', False):
+            return None
+        elo1 = self.args.get('sprtElo1', None)
+        if elo1 is None:
+            elo1 = scoreToElo(self.args.updateThreshold)
+        return SPRT(self.args.get('sprtElo0', 0), elo1,
+                    self.args.get('sprtAlpha', 0.05), self.args.get('sprtBeta', 0.05))
+
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + ''
 
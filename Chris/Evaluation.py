@@ -0,0 +1,71 @@
+import logging
+
+import numpy as np
+
+from Arena import Arena, BatchedArena
+from hex.HexPlayers import RandomPlayer
+from utils import dotdict
+
+log = logging.getLogger(__name__)
+
+
+class EvaluationSuite():
+    """
+    Tracks the strength of the network against RandomPlayer every iteration.
+    The evaluation modes are given by args.evalModes:
+        'raw':  the network plays its policy without search; the moves of all
+                concurrent games come from one batched predict per step
+        'mcts': the network plays MCTS with args.evalMCTSSims simulations,
+                with batched evaluations across concurrent games
+        'full': the network plays MCTS with numMCTSSims, one game at a time
+                (the arena used before the suite existed)
+    The results are appended to evaluation_random.csv as
+    iteration,randomWins,netWins,draws,mode.
+    """
+
+    def __init__(self, game, args, filename="evaluation_random.csv"):
+        self.game = game
+        self.args = args
+        self.filename = filename
+        self.modes = args.get('evalModes', ['full'])
+        self.numGames = args.get('evalGames', args.arenaCompare)
+        self.numParallel = args.get('evalParallel', 16)
+        self.gameEnded = game.getGameEnded
+        if args.get('vcTermination', False) and hasattr(game, 'getGameEndedVC'):
+            self.gameEnded = game.getGameEndedVC  # like the other arenas, games end once a virtual connection decides them
+
+    def reset(self):
+        """
+        Empties the results file.
+        """
+        f = open(self.filename, "w")
+        f.close()
+
+    def run(self, nnet, mcts, iteration):
+        """
+        Evaluates nnet in every mode. mcts is the full-budget search used by the
+        'full' mode.
+
+        Returns:
+            results: dict from mode to (randomWins, netWins, draws)
+        """
+        results = {}
+        random = RandomPlayer(self.game).play
+        for mode in self.modes:
+            if mode == 'full':
+                arena = Arena(random, lambda x, player: np.argmax(mcts.getActionProb(x, temp=0, player=player)),
+                              self.game, self.game.display, self.gameEnded)
+                results[mode] = arena.playGames(self.args.arenaCompare, verbose=False)
+            elif mode in ('raw', 'mcts'):
+                sims = 0 if mode == 'raw' else self.args.get('evalMCTSSims', 10)
+                args = dotdict({**self.args, 'numMCTSSims': sims})
+                arena = BatchedArena(random, nnet, self.game, args, self.numParallel, self.game.display)
+                results[mode] = arena.playGames(self.numGames, verbose=False)
+            else:
+                raise ValueError(f"unknown evaluation mode {mode}, must be in: ['raw', 'mcts', 'full']")
+
+            randomWins, netWins, draws = results[mode]
+            log.info(f'EVALUATION {mode.upper()} NET/RANDOM WINS : {netWins} / {randomWins} ; DRAWS : {draws}')
+            with open(self.filename, "a") as f:
+                f.write(f"{iteration},{randomWins},{netWins},{draws},{mode}\n")
+        return results
@@ -1,5 +1,6 @@
 import logging
 import math
+import time
 
 import numpy as np
 
@@ -13,32 +14,105 @@ class MCTS():
     This class handles the MCTS tree.
     """
 
-    def __init__(self, game, nnet, args):
+    def __init__(self, game, nnet, args, profiler=None):
         self.game = game
         self.nnet = nnet
         self.args = args
-        self.Qsa = {}  # stores Q values for s,a (as defined in the paper)
-        self.Nsa = {}  # stores #times edge s,a was visited
+        self.profiler = profiler  # optional Profiler for the time spent per search step
+        self.Qsa = {}  # stores Q values for s,a (as defined in the paper), as Qsa[s][a]
+        self.Nsa = {}  # stores #times edge s,a was visited, as Nsa[s][a]
         self.Ns = {}  # stores #times board s was visited
         self.Ps = {}  # stores initial policy (returned by neural net)
 
         self.Es = {}  # stores game.getGameEnded ended for board s
         self.Vs = {}  # stores game.getValidMoves for board s
 
-    def getActionProb(self, canonicalBoard, player, temp=1):
+        # incremental Zobrist keys instead of packed board keys (needs game.getZobristKey)
+        self.zobrist = self.args.get('zobristKeys', False) and hasattr(game, 'getZobristKey')
+
+        # drop inferior moves from the valid moves (needs game.getReducedValidMoves)
+        self.prune = self.args.get('pruneInferior', False) and hasattr(game, 'getReducedValidMoves')
+
+        # exact results for positions with at most solverMaxEmpty empty cells (needs game.getSolver)
+        self.solver = None
+        if self.args.get('solverMaxEmpty', None) is not None and hasattr(game, 'getSolver'):
+            self.solver = game.getSolver(self.args.solverMaxEmpty, self.args.get('solverBudget', 10000))
+
+    def positionKey(self, canonicalBoard, player, key=None):
+        """
+        Returns the dictionary key for canonicalBoard: either the incremental
+        Zobrist key pair passed down from the parent, or the game's compact
+        stringRepresentation.
+        """
+        if self.zobrist:
+            if key is None:
+                key = self.game.getZobristKey(canonicalBoard)
+            return key
+        return self.game.stringRepresentation(canonicalBoard)
+
+    def getActionProb(self, canonicalBoard, player, temp=1, numSims=None):
         """
         This function performs numMCTSSims simulations of MCTS starting from
-        canonicalBoard.
+        canonicalBoard, or numSims simulations if it is given.
+
+        If args.timeBudget (seconds) is set, it instead searches until the
+        budget is used up, with at least args.minSims simulations. It stops
+        early once the most visited action can no longer be overtaken in the
+        simulations that the remaining time allows.
 
         Returns:
             probs: a policy vector where the probability of the ith action is
                    proportional to Nsa[(s,a)]**(1./temp)
         """
-        for i in range(self.args.numMCTSSims):
-            self.search(np.copy(canonicalBoard), player)
+        s = self.positionKey(canonicalBoard, player)
+        timeBudget = self.args.get('timeBudget', None)
+        if timeBudget is not None:
+            self.searchTimed(canonicalBoard, player, s, timeBudget, self.args.get('minSims', 1))
+            return self.getVisitProb(canonicalBoard, player, temp)
+
+        if numSims is None:
+            numSims = self.args.numMCTSSims
+        for i in range(numSims):
+            self.search(np.copy(canonicalBoard), player, s)
+
+        return self.getVisitProb(canonicalBoard, player, temp)
+
+    def searchTimed(self, canonicalBoard, player, s, timeBudget, minSims):
+        """
+        Runs simulations from canonicalBoard (with key s) for timeBudget
+        seconds, see getActionProb.
+
+        Returns:
+            sims: the number of simulations that were run
+        """
+        start = time.time()
+        sims = 0
+        while True:
+            self.search(np.copy(canonicalBoard), player, s)
+            sims += 1
+            elapsed = time.time() - start
+            if sims < minSims:
+                continue
+            if elapsed >= timeBudget or s not in self.Nsa:
+                return sims
+            if elapsed <= 0:
+                continue # no rate to extrapolate yet
+
+            # the best action is decided if the runner-up cannot catch up at the current rate
+            remaining = (timeBudget - elapsed) * sims / elapsed
+            counts = sorted(self.Nsa[s].values(), reverse=True) + [0, 0] # the first simulation only expands the root
+            if counts[0] - counts[1] > remaining:
+                return sims
 
-        s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s, a)] if (s, a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
+    def getVisitProb(self, canonicalBoard, player, temp=1):
+        """
+        Returns:
+            probs: the policy vector of getActionProb, from the visit counts
+                   the tree already holds for canonicalBoard
+        """
+        s = self.positionKey(canonicalBoard, player)
+        Nsa = self.Nsa.get(s, {})
+        counts = [Nsa.get(a, 0) for a in range(self.game.getActionSize())]
 
         if temp == 0:
             bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
@@ -52,9 +126,22 @@ class MCTS():
         probs = [x / counts_sum for x in counts]
         return probs
 
-    def search(self, canonicalBoard, player):
+    def getRootValue(self, canonicalBoard, player):
+        """
+        Returns:
+            v: the Q value of the most visited action from canonicalBoard, from
+               the point of view of the player to move (0 if it was not searched)
         """
-        This function performs one iteration of MCTS. It is recursively called
+        s = self.positionKey(canonicalBoard, player)
+        Nsa = self.Nsa.get(s)
+        if not Nsa:
+            return 0
+        a = max(Nsa, key=Nsa.get)
+        return float(self.Qsa[s][a])
+
+    def search(self, canonicalBoard, player, key=None):
+        """
+        This function performs one iteration of MCTS. It walks down the tree
         till a leaf node is found. The action chosen at each node is one that
         has the maximum upper confidence bound as in the paper.
 
@@ -64,74 +151,165 @@ class MCTS():
         outcome is propagated up the search path. The values of Ns, Nsa, Qsa are
         updated.
 
+        The three steps are also available separately as selectLeaf,
+        expandLeaf and backup, so that the network evaluations of several
+        searches can be batched (see Arena.BatchedArena).
+
         NOTE: the return values are the negative of the value of the current
         state. This is done since v is in [-1,1] and if v is the value of a
         state for the current player, then its value is -v for the other player.
 
+        key is the position key of canonicalBoard when it is already known
+        (the root key, or the incremental Zobrist key from the parent).
+
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
+        prof = self.profiler
+        path, leaf, v = self.selectLeaf(canonicalBoard, player, key)
+        if leaf is not None:
+            if prof is not None:
+                t = time.perf_counter()
+            pi, v = self.nnet.predict(leaf[1])
+            if prof is not None:
+                prof.lap('inference', t)
+            v = self.expandLeaf(leaf, pi, v)
+        return self.backup(path, v)
 
-        s = self.game.stringRepresentation(canonicalBoard)
+    def selectLeaf(self, canonicalBoard, player, key=None):
+        """
+        Walks down the tree from canonicalBoard, picking the action with the
+        highest upper confidence bound, until a terminal state or a state that
+        has not been expanded yet. canonicalBoard is modified.
 
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, player) #TODO check this based on player
-        if self.Es[s] != 0:
-            # terminal node
-            return -self.Es[s]
+        Returns:
+            path: the list of (s, a) edges that were taken
+            leaf: (s, canonicalBoard, player) of the state to evaluate with
+                  the network and pass to expandLeaf, or None if the walk
+                  ended in a terminal state
+            v: for a terminal state, the value to pass to backup
+        """
+        prof = self.profiler
+        path = []
+        while True:
+            if prof is not None:
+                t = time.perf_counter()
+            s = self.positionKey(canonicalBoard, player, key)
+            if prof is not None:
+                t = prof.lap('stringRepresentation', t)
 
-        if s not in self.Ps:
-            # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, player)
-            self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s  # renormalize
-            else:
-                # if all valid moves were masked make all valid moves equally probable
+            if s not in self.Es:
+                if self.prune:
+                    # before getGameEnded, which changes canonicalBoard
+                    self.Vs[s] = self.game.getReducedValidMoves(canonicalBoard, player)
+                solved = 0
+                if self.solver is not None and path:
+                    # a solved position below the root is treated as terminal, its subtree is never searched
+                    solved = self.game.getSolvedResult(canonicalBoard, player, self.solver)
+                    if prof is not None:
+                        t = prof.lap('solver', t)
+                self.Es[s] = solved or self.game.getGameEnded(canonicalBoard, player) #TODO check this based on player
+                if prof is not None:
+                    t = prof.lap('getGameEnded', t)
+            elif prof is not None:
+                prof.count('Es_hits')
+            if self.Es[s] != 0:
+                # terminal node
+                return path, None, -self.Es[s]
 
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                log.error("All valid moves were masked, doing a workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
+            if s not in self.Ps:
+                # leaf node
+                return path, (s, canonicalBoard, player), None
+            if prof is not None:
+                prof.count('Ps_hits')
 
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
+            valids = self.Vs[s]
+            Ps, Qs, Ns = self.Ps[s], self.Qsa[s], self.Nsa[s]
+            cur_best = -float('inf')
+            best_act = -1
 
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
+            # pick the action with the highest upper confidence bound
+            for a in range(self.game.getActionSize()):
+                if valids[a]:
+                    if a in Qs:
+                        u = Qs[a] + self.args.cpuct * Ps[a] * math.sqrt(self.Ns[s]) / (1 + Ns[a])
+                    else:
+                        u = self.args.cpuct * Ps[a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
 
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s, a) in self.Qsa:
-                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                            1 + self.Nsa[(s, a)])
-                else:
-                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
+                    if u > cur_best:
+                        cur_best = u
+                        best_act = a
 
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
+            a = best_act
+            path.append((s, a))
+            if prof is not None:
+                t = prof.lap('selection', t)
+            key = self.game.getNextZobristKey(s, a) if self.zobrist else None
+            next_s, next_player = self.game.getNextState(canonicalBoard, player, a) # TODO added player instead of 1
+            canonicalBoard = self.game.getCanonicalForm(next_s, next_player)
+            player = next_player # TODO added player parameter
+            if prof is not None:
+                prof.lap('getNextState', t)
 
+    def expandLeaf(self, leaf, pi, v):
+        """
+        Stores the network output pi, v for a leaf returned by selectLeaf.
 
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, player, a) # TODO added player instead of 1
-        next_s = self.game.getCanonicalForm(next_s, next_player)
+        Returns:
+            v: the negative of the value of the leaf, to pass to backup
+        """
+        prof = self.profiler
+        if prof is not None:
+            t = time.perf_counter()
+        s, canonicalBoard, player = leaf
+        self.Ps[s] = pi
+        valids = self.Vs[s] if s in self.Vs else self.game.getValidMoves(canonicalBoard, player)
+        self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
+        sum_Ps_s = np.sum(self.Ps[s])
+        if sum_Ps_s > 0:
+            self.Ps[s] /= sum_Ps_s  # renormalize
+        else:
+            # if all valid moves were masked make all valid moves equally probable
 
-        v = self.search(next_s, next_player) # TODO added player parameter
+            # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+            # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
+            log.error("All valid moves were masked, doing a workaround.")
+            self.Ps[s] = self.Ps[s] + valids
+            self.Ps[s] /= np.sum(self.Ps[s])
 
-        if (s, a) in self.Qsa:
-            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
-            self.Nsa[(s, a)] += 1
+        self.Vs[s] = valids
+        self.Ns[s] = 0
+        self.Qsa[s] = {}
+        self.Nsa[s] = {}
+        if prof is not None:
+            prof.lap('expand', t)
+        return -v
 
-        else:
-            self.Qsa[(s, a)] = v
-            self.Nsa[(s, a)] = 1
+    def backup(self, path, v):
+        """
+        Propagates the value v returned by selectLeaf or expandLeaf up the
+        path, updating Ns, Nsa and Qsa.
+
+        Returns:
+            v: the negative of the value of the state the path starts from
+        """
+        prof = self.profiler
+        if prof is not None:
+            t = time.perf_counter()
+        for s, a in reversed(path):
+            Qs, Ns = self.Qsa[s], self.Nsa[s]
+            if a in Qs:
+                Qs[a] = (Ns[a] * Qs[a] + v) / (Ns[a] + 1)
+                Ns[a] += 1
+
+            else:
+                Qs[a] = v
+                Ns[a] = 1
 
-        self.Ns[s] += 1
-        return -v
\ No newline at end of file
+            self.Ns[s] += 1
+            v = -v
+        if prof is not None:
+            prof.lap('backup', t)
+            prof.gauge('tree_states', len(self.Es))
+            prof.gauge('tree_expanded', len(self.Ns))
+        return v
\ No newline at end of file
@@ -18,9 +18,10 @@ class NeuralNet():
 
         Input:
             examples: a list of training examples, where each example is of form
-                      (board, pi, v). pi is the MCTS informed policy vector for
-                      the given board, and v is its value. The examples has
-                      board in its canonical form.
+                      (board, pi, v) or (board, pi, v, isFullSearch). pi is the
+                      MCTS informed policy vector for the given board, and v is
+                      its value. The examples has board in its canonical form.
+                      If isFullSearch is False, pi should not be trained on.
         """
         pass
 
@@ -36,6 +37,32 @@ class NeuralNet():
         """
         pass
 
+    def predict_batch(self, boards):
+        """
+        Input:
+            boards: a list of boards in their canonical form.
+
+        Returns:
+            pis: the policy vectors of the boards, as from predict
+            vs: the values of the boards, as from predict
+        """
+        outputs = [self.predict(board) for board in boards]
+        return [pi for pi, v in outputs], [v for pi, v in outputs]
+
+    def get_weights(self):
+        """
+        Returns:
+            weights: an in-memory copy of the parameters of the neural network
+        """
+        pass
+
+    def set_weights(self, weights):
+        """
+        Replaces the parameters of the neural network with weights obtained
+        from get_weights (of this or another network of the same class).
+        """
+        pass
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
@@ -0,0 +1,65 @@
+import json
+import time
+from collections import defaultdict
+
+
+class Profiler():
+    """
+    Cumulative wall time and call counts per named section, plus gauges, for
+    the search hot path. Code that supports profiling holds an optional
+    profiler and only calls it when one is set, so disabled profiling costs a
+    single None check per section.
+    """
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.gauges = {}
+
+    def lap(self, name, start):
+        """
+        Adds the time since start to section name.
+
+        Returns:
+            now: the current time, to start the next section from
+        """
+        now = time.perf_counter()
+        self.times[name] += now - start
+        self.calls[name] += 1
+        return now
+
+    def add(self, name, seconds):
+        self.times[name] += seconds
+        self.calls[name] += 1
+
+    def count(self, name, n=1):
+        self.calls[name] += n
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        """
+        Returns the counters so far, to pass to summary(since=...).
+        """
+        return dict(self.times), dict(self.calls)
+
+    def summary(self, since=None):
+        """
+        Returns:
+            summary: dict with the time and calls per section (since the given
+                     snapshot, if any) and the latest gauge values
+        """
+        times, calls = since if since is not None else ({}, {})
+        return {
+            'time': {k: v - times.get(k, 0.) for k, v in self.times.items()},
+            'calls': {k: v - calls.get(k, 0) for k, v in self.calls.items()},
+            'gauges': dict(self.gauges),
+        }
+
+    def dump(self, filename, since=None, **fields):
+        """
+        Appends summary(since) together with fields as a JSON line to filename.
+        """
+        with open(filename, "a") as f:
+            f.write(json.dumps({**fields, **self.summary(since)}) + "\n")
@@ -0,0 +1,54 @@
+import math
+
+
+def eloToScore(elo):
+    """expected score of a player that is elo points stronger"""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def scoreToElo(score):
+    """elo difference that gives the expected score"""
+    return -400 * math.log10(1 / score - 1)
+
+
+class SPRT():
+    """
+    Sequential probability ratio test of H0: the new network is elo0 stronger
+    than the old one, against H1: it is elo1 stronger. Draws count as half a
+    win and half a loss.
+    """
+
+    def __init__(self, elo0, elo1, alpha=0.05, beta=0.05):
+        """
+        Input:
+            elo0, elo1: elo difference under H0 and H1 (elo0 < elo1)
+            alpha: probability of accepting H1 when H0 is true
+            beta: probability of accepting H0 when H1 is true
+        """
+        self.p0 = eloToScore(elo0)
+        self.p1 = eloToScore(elo1)
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def llr(self, wins, losses, draws):
+        """
+        Returns:
+            llr: log likelihood ratio of H1 versus H0 given the results of the
+                 new network
+        """
+        w = wins + draws / 2
+        l = losses + draws / 2
+        return w * math.log(self.p1 / self.p0) + l * math.log((1 - self.p1) / (1 - self.p0))
+
+    def status(self, wins, losses, draws):
+        """
+        Returns:
+            'H1' if the new network should be accepted, 'H0' if it should be
+            rejected, None if more games are needed
+        """
+        llr = self.llr(wins, losses, draws)
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
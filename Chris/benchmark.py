@@ -0,0 +1,196 @@
+"""
+Performance benchmarks of the Hex engine, the classical searches and the
+AlphaZero search/inference, per board size.
+
+Usage (from the Chris folder):
+    python benchmark.py --out bench.json
+    python benchmark.py --out new.json --compare bench.json --tolerance 0.15
+
+Every result is a rate (higher is better) or a latency (lower is better).
+With --compare, results that are worse than the baseline by more than the
+tolerance are reported and the exit code is 1.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+from hex.HexBoard import HexBoard
+from hex.HexGame import HexGame
+from hex.Player import Alpha_Beta, MCTS as UCT_MCTS
+from MCTS import MCTS
+from utils import dotdict
+
+
+class UniformNet():
+    """stand-in network with a uniform policy and value 0, so only the search is measured"""
+    def __init__(self, game):
+        self.action_size = game.getActionSize()
+
+    def predict(self, board):
+        return np.ones(self.action_size) / self.action_size, np.zeros(1)
+
+
+def midgame_board(n, fill=1/3, seed=0):
+    """board with about fill of the cells taken, alternating colors, that is not decided yet"""
+    rng = random.Random(seed)
+    while True:
+        board = HexBoard(n)
+        cells = list(board.board)
+        rng.shuffle(cells)
+        color = HexBoard.BLUE
+        for c in cells[:int(fill * n * n)]:
+            board.place(c, color)
+            color = board.get_opposite_color(color)
+        if not board.is_game_over():
+            return board, color
+
+
+def rate(fn, min_time):
+    """calls per second of fn, running it for at least min_time seconds"""
+    fn()
+    calls, start = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+def bench_engine(n, opts):
+    board, color = midgame_board(n)
+    move = board.get_move_list()[0]
+    game = HexGame(n)
+    player = 1 if color == HexBoard.BLUE else -1
+    canonical = game.getCanonicalForm(board, player)
+    action = int(np.flatnonzero(game.getValidMoves(canonical, player))[0])
+
+    def place():
+        board.place(move, color)
+        board.undo_move(move)
+
+    return {
+        'board.place+undo': rate(place, opts.min_time),
+        'board.check_win': rate(lambda: board.check_win(color), opts.min_time),
+        'board.clone': rate(board.clone, opts.min_time),
+        'game.getCanonicalForm': rate(lambda: game.getCanonicalForm(board, player), opts.min_time),
+        'game.getNextState': rate(lambda: game.getNextState(np.copy(canonical), player, action), opts.min_time),
+        'game.getGameEnded': rate(lambda: game.getGameEnded(np.copy(canonical), player), opts.min_time),
+    }
+
+
+def bench_search(n, opts):
+    board, color = midgame_board(n)
+    results = {}
+
+    ab = Alpha_Beta(heuristic="dijkstra")
+    ab.set_color(color)
+    results['dijkstra_eval'] = rate(lambda: ab._dijkstra_eval(board), opts.min_time)
+    results['resistance_eval'] = rate(lambda: ab._resistance_eval(board), opts.min_time)
+
+    ab = Alpha_Beta(heuristic=opts.ab_heuristic, depth=opts.ab_depth)
+    ab.set_color(color)
+    nodes = [0]
+    search = ab._alpha_beta
+    def counting_search(*args, **kwargs):
+        nodes[0] += 1
+        return search(*args, **kwargs)
+    ab._alpha_beta = counting_search  # recursive calls go through the instance attribute
+    start = time.perf_counter()
+    ab._alpha_beta(board, opts.ab_depth, -np.inf, np.inf, color)
+    results['alpha_beta.nodes_per_s'] = nodes[0] / (time.perf_counter() - start)
+
+    uct = UCT_MCTS()
+    start = time.perf_counter()
+    uct._MCTS(board.clone(), color, max_iter=opts.playouts)
+    results['uct_mcts.playouts_per_s'] = opts.playouts / (time.perf_counter() - start)
+
+    game = HexGame(n)
+    player = 1 if color == HexBoard.BLUE else -1
+    canonical = game.getCanonicalForm(board, player)
+    mcts = MCTS(game, UniformNet(game), dotdict({'numMCTSSims': opts.sims, 'cpuct': 1}))
+    start = time.perf_counter()
+    mcts.getActionProb(canonical, player)
+    results['az_mcts.sims_per_s'] = opts.sims / (time.perf_counter() - start)
+    return results
+
+
+def bench_predict(n, opts):
+    from hex.keras.NNet import NNetWrapper
+    game = HexGame(n)
+    nnet = NNetWrapper(game)
+    board = game.getCanonicalForm(midgame_board(n)[0], 1)
+    nnet.predict(board)
+    times = []
+    for _ in range(opts.predict_repeats):
+        start = time.perf_counter()
+        nnet.predict(board)
+        times.append(time.perf_counter() - start)
+    return {'nnet.predict_ms': 1000 * float(np.median(times))}
+
+
+def lower_is_better(name):
+    return name.endswith('_ms')
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        regressions: (name, size, new, old) of the results that are worse than
+                     the baseline by more than tolerance
+    """
+    regressions = []
+    for size, metrics in results.items():
+        for name, new in metrics.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None:
+                continue
+            ratio = old / new if lower_is_better(name) else new / old
+            flag = "REGRESSION" if ratio < 1 - tolerance else ""
+            print(f"{name:>26} n={size:<3} {old:>12.2f} -> {new:>12.2f} ({ratio:6.2f}x) {flag}")
+            if flag:
+                regressions.append((name, size, new, old))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the Hex engine, searches and inference")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[5, 7, 9, 11, 13])
+    parser.add_argument('--out', default='bench.json', help="file the results are written to")
+    parser.add_argument('--compare', default=None, help="baseline results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed slowdown before a result is a regression")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds each micro benchmark runs")
+    parser.add_argument('--ab-depth', type=int, default=2)
+    parser.add_argument('--ab-heuristic', default="random", choices=["random", "dijkstra", "resistance"])
+    parser.add_argument('--playouts', type=int, default=50, help="playouts of the UCT MCTS player")
+    parser.add_argument('--sims', type=int, default=200, help="simulations of the AlphaZero MCTS")
+    parser.add_argument('--predict-repeats', type=int, default=20)
+    parser.add_argument('--no-predict', action='store_true', help="skip the network latency, the only benchmark that builds a network")
+    opts = parser.parse_args()
+
+    results = {}
+    for n in opts.sizes:
+        metrics = {}
+        metrics.update(bench_engine(n, opts))
+        metrics.update(bench_search(n, opts))
+        if not opts.no_predict:
+            metrics.update(bench_predict(n, opts))
+        results[str(n)] = metrics
+        for name, value in metrics.items():
+            print(f"{name:>26} n={n:<3} {value:>12.2f}")
+
+    with open(opts.out, "w") as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                   'options': vars(opts), 'results': results}, f, indent=2)
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, opts.tolerance)
+        print(f"{len(regressions)} regression(s) beyond {opts.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,53 @@
+"""
+Registry of the Hex agents that can enter a game or tournament.
+
+Agents are registered by name with a factory, or with the import path of a
+factory as "module:attribute". Import paths are only resolved when an agent
+is made, so heavy backends such as TensorFlow are only imported when an
+agent that needs them is actually constructed.
+"""
+import importlib
+
+AGENTS = {}
+
+
+def register_agent(name, factory):
+    """
+    Registers factory under name. factory is a callable that takes the agent
+    keyword arguments and returns a player (with set_color, move, reset and close),
+    or the "module:attribute" import path of such a callable.
+    """
+    AGENTS[name] = factory
+
+
+def make_agent(name, **kwargs):
+    """returns a new player of the agent registered as name"""
+    if name not in AGENTS:
+        raise ValueError(f"unknown agent {name}, must be in: {sorted(AGENTS)}")
+    factory = AGENTS[name]
+    if isinstance(factory, str):
+        module, attribute = factory.split(":")
+        factory = getattr(importlib.import_module(module, package=__package__), attribute)
+        AGENTS[name] = factory
+    return factory(**kwargs)
+
+
+def _human():
+    from .Player import Player
+    return Player(is_human=True)
+
+
+def _alpha_beta(**kwargs):
+    from .Player import Player, Alpha_Beta
+    return Player(is_human=False, ai=Alpha_Beta(**kwargs))
+
+
+def _mcts(**kwargs):
+    from .Player import Player, MCTS
+    return Player(is_human=False, ai=MCTS(**kwargs))
+
+
+register_agent("human", _human)
+register_agent("alphabeta", _alpha_beta)
+register_agent("mcts", _mcts)
+register_agent("alphazero", ".Player:A0_Player")  # loads TensorFlow with the first network
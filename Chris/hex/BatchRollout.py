@@ -0,0 +1,93 @@
+"""
+Batched random playouts of Hex positions with NumPy.
+
+A random playout of Hex can be played as a random fill-in of all empty
+cells, alternating the colors: a chain that connects two edges stays there,
+so the filled board has the same winner as the game stopped at its first
+connection. random_fill makes B fill-ins at once as a B x n x n int8 array
+(cells [x, y] hold the HexBoard colors), and winners finds the winner of
+every board with a flood fill over the whole batch.
+"""
+import numpy as np
+
+from .HexBoard import HexBoard
+
+# the six neighbour directions of a cell (x, y)
+DIRECTIONS = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
+
+
+def board_array(board):
+    """returns the cells of board as an n x n int8 array of HexBoard colors"""
+    return np.fromiter(board.board.values(), dtype=np.int8, count=board.size**2).reshape(board.size, board.size)
+
+
+def random_fill(board, color, batch_size, rng=np.random):
+    """
+    Returns:
+        boards: batch_size x n x n random fill-ins of board, in which color
+                (the player to move) gets the first, third, ... empty cell
+    """
+    cells = board_array(board).reshape(-1)
+    empty = np.flatnonzero(cells == HexBoard.EMPTY)
+    boards = np.repeat(cells[None, :], batch_size, axis=0)
+    if len(empty):
+        # the rank of every empty cell in a random order of play, even ranks are played by color
+        order = np.argsort(rng.random_sample((batch_size, len(empty))), axis=1)
+        ranks = np.argsort(order, axis=1)
+        opponent = HexBoard.RED if color == HexBoard.BLUE else HexBoard.BLUE
+        boards[:, empty] = np.where(ranks % 2 == 0, color, opponent)
+    return boards.reshape(batch_size, board.size, board.size)
+
+
+def _grow(reach, stones):
+    """adds the stones next to reach to it, for every board of the batch"""
+    grown = reach.copy()
+    n = reach.shape[1]
+    for dx, dy in DIRECTIONS:
+        xs, xd = slice(max(0, -dx), n - max(0, dx)), slice(max(0, dx), n - max(0, -dx))
+        ys, yd = slice(max(0, -dy), n - max(0, dy)), slice(max(0, dy), n - max(0, -dy))
+        grown[:, xd, yd] |= reach[:, xs, ys]
+    return grown & stones
+
+
+def connected(boards, color):
+    """
+    Returns:
+        won: for every board of the batch, whether color connects its edges
+             (x = 0 to n-1 for blue, y = 0 to n-1 for red)
+    """
+    if color == HexBoard.RED:
+        boards = boards.transpose(0, 2, 1) # a symmetry of the board that swaps the edges
+    return connects_x(boards == color)
+
+
+def connects_x(stones):
+    """
+    Returns:
+        won: for every B x n x n boolean array of stones, whether the stones
+             connect x = 0 to x = n-1
+    """
+    reach = np.zeros_like(stones)
+    reach[:, 0, :] = stones[:, 0, :]
+    while True:
+        grown = _grow(reach, stones)
+        if np.array_equal(grown, reach):
+            return reach[:, -1, :].any(axis=1)
+        reach = grown
+
+
+def winners(boards):
+    """returns the winning color of every (filled) board of the batch"""
+    return np.where(connected(boards, HexBoard.BLUE), HexBoard.BLUE, HexBoard.RED).astype(np.int8)
+
+
+def rollout(board, color, batch_size, rng=np.random):
+    """
+    Plays batch_size random playouts from board with color to move.
+
+    Returns:
+        boards: the filled boards
+        winners: the winning color of each
+    """
+    boards = random_fill(board, color, batch_size, rng)
+    return boards, winners(boards)
@@ -3,7 +3,7 @@ import numpy as np
 from collections import OrderedDict
 from trueskill import Rating, rate_1vs1
 from .HexBoard import HexBoard
-from .Player import Player, Alpha_Beta, MCTS, A0_Player
+from .Agents import make_agent
 import sys
 from tqdm import tqdm
 
@@ -26,9 +26,13 @@ class Game():
         if choice == 1:
             players = self._select_players(2)
             self.play_game(players)
+            for p in players:
+                p.close()
         elif choice == 2:
             players = self._select_players( int(input("how many players in the tournament? .. ")))
             self.tournament( int(input("how many games?")), players)
+            for p in players:
+                p.close()
         elif choice == 3:
             new_size = int(input("What size?"))
             self._set_size(new_size)
@@ -54,26 +58,28 @@ class Game():
             """.format(i+1))
             choice = int(input("choice: "))
             if choice == 1:
-                players.append(Player(is_human=True))
+                players.append(make_agent("human"))
             elif choice == 2:
-                players.append(Player(is_human=False, ai=Alpha_Beta(heuristic="random", depth=3)))
+                players.append(make_agent("alphabeta", heuristic="random", depth=3))
             elif choice == 3:
-                players.append(Player(is_human=False, ai=Alpha_Beta(heuristic="dijkstra", depth=3)))
+                players.append(make_agent("alphabeta", heuristic="dijkstra", depth=3))
             elif choice == 4:
-                players.append(Player(is_human=False, ai=Alpha_Beta(heuristic="dijkstra", depth=4)))
+                players.append(make_agent("alphabeta", heuristic="dijkstra", depth=4))
             elif choice == 5:
                 if search_time == None:
                     search_time = float(input("How much time can the ai player spend on their turn? (s): "))
-                players.append(Player(is_human=False, ai=Alpha_Beta(heuristic="dijkstra", id=True, max_time=search_time)))
+                players.append(make_agent("alphabeta", heuristic="dijkstra", id=True, max_time=search_time))
             elif choice == 6:
                 if search_time == None:
                     search_time = float(input("How much time can the ai player spend on their turn? (s): "))
-                players.append(Player(is_human=False, ai=MCTS(max_time=search_time))) 
+                players.append(make_agent("mcts", max_time=search_time))
             elif choice == 7:
-                players.append(A0_Player(self.size))
+                if search_time == None:
+                    search_time = float(input("How much time can the ai player spend on their turn? (s): "))
+                players.append(make_agent("alphazero", n=self.size, max_time=search_time))
             else:
                 print("Invalid choice, defaulting to random evaluation, search depth 3")
-                players.append(Player(is_human=False, heuristic="random", depth=3))
+                players.append(make_agent("alphabeta", heuristic="random", depth=3))
             
         return players
 
@@ -113,7 +119,7 @@ class Game():
         return mean, std
 
 
-    def play_game(self, players):
+    def play_game(self, players, verbose=True):
         board = HexBoard(self.size)
 
         p1, p2 = players
@@ -134,11 +140,14 @@ class Game():
             # board.print()
 
         if board.check_win(board.BLUE):
-            print("blue wins")
+            if verbose:
+                print("blue wins")
             return 0
         elif board.check_win(board.RED):
-            print("red wins")
+            if verbose:
+                print("red wins")
             return 1
         else:
-            print("draw")
+            if verbose:
+                print("draw")
             return 2
\ No newline at end of file
@@ -0,0 +1,85 @@
+import numpy as np
+
+from .BatchRollout import connects_x
+
+
+class HexBatchGame():
+    """
+    N games of Hex on n x n boards in one N x n x n int8 array, with blue
+    stones as 1, red stones as -1 and empty cells as 0 (the canonical board
+    of HexGame for player 1). Every game has its own player to move.
+
+    Actions are the actions of HexGame: indices into the canonical board of
+    the player to move, so the output of a network on canonical() can be
+    passed to step directly. With auto_reset, a game that ends in step starts
+    again from the empty board with player 1 to move.
+    """
+    def __init__(self, n, num_games, auto_reset=True):
+        self.n = n
+        self.num_games = num_games
+        self.auto_reset = auto_reset
+        self.boards = np.zeros((num_games, n, n), dtype=np.int8)
+        self.players = np.ones(num_games, dtype=np.int8)
+        self.reset()
+
+    def reset(self, games=None):
+        """starts the games with the given indices (all by default) again"""
+        if games is None:
+            games = slice(None)
+        self.boards[games] = 0
+        self.players[games] = 1
+
+    def getActionSize(self):
+        return self.n * self.n
+
+    def canonical(self):
+        """
+        Returns:
+            boards: the N canonical boards of the players to move, equal to
+                    HexGame.getCanonicalForm of every game
+        """
+        boards = self.boards.astype(np.float64)
+        red = self.players == -1
+        boards[red] = -boards[red].transpose(0, 2, 1)
+        return boards
+
+    def valid_masks(self):
+        """returns the N x action size masks of the valid actions (HexGame.getValidMoves)"""
+        return (self.canonical() == 0).reshape(self.num_games, -1)
+
+    def random_actions(self, rng=np.random):
+        """returns a uniformly random valid action for every game"""
+        return np.argmax(rng.random_sample((self.num_games, self.getActionSize())) * self.valid_masks(), axis=1)
+
+    def winners(self):
+        """returns 1 for the games blue has won, -1 for the ones red has won and 0 for the others"""
+        blue = connects_x(self.boards == 1)
+        red = connects_x((self.boards == -1).transpose(0, 2, 1))
+        return blue.astype(np.int8) - red.astype(np.int8)
+
+    def terminal(self):
+        """returns HexGame.getGameEnded of every game: 1 or -1 if the player to move won or lost, 0 if it goes on"""
+        return self.winners() * self.players
+
+    def step(self, actions):
+        """
+        Plays one action in every game.
+
+        Returns:
+            boards: canonical() after the moves (and resets)
+            rewards: 1 where the player that moved has won the game, else 0
+            dones: the games that ended with this move
+        """
+        x, y = np.unravel_index(np.asarray(actions), (self.n, self.n))
+        red = self.players == -1
+        x, y = np.where(red, y, x), np.where(red, x, y) # the canonical board of player -1 is transposed
+        games = np.arange(self.num_games)
+        assert np.all(self.boards[games, x, y] == 0), "Picking an occupied space"
+        self.boards[games, x, y] = self.players
+
+        rewards = (self.winners() == self.players).astype(np.int8)
+        dones = rewards == 1
+        self.players = -self.players
+        if self.auto_reset and dones.any():
+            self.reset(dones)
+        return self.canonical(), rewards, dones
@@ -1,13 +1,26 @@
 from __future__ import print_function
 from .HexBoard import HexBoard
+from .Solver import Solver
+from .InferiorCells import reduced_moves
+from .VirtualConnections import decided
 from Game import Game
 import sys
+import random
 import numpy as np
 
 class HexGame(Game):
 
     def __init__(self, n):
         self.n = n
+        self._initZobrist()
+
+    def _initZobrist(self, seed=0):
+        # one 64 bit key per (cell, stone) with stone 0 -> +1 and stone 1 -> -1
+        rng = random.Random(seed)
+        self.zobrist = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(self.n * self.n)]
+        # keys of the transposed and negated board, which is what getNextState hands to the opponent
+        self.zobristT = [(self.zobrist[y*self.n + x][1], self.zobrist[y*self.n + x][0])
+                         for x in range(self.n) for y in range(self.n)]
 
     def getInitBoard(self):
         # return initial board (numpy board)
@@ -33,10 +46,32 @@ class HexGame(Game):
 
         return (board, -player)
 
+    def actionToMove(self, action, player):
+        # coordinates on the HexBoard of an action taken on the canonical board of player
+        x, y = np.unravel_index(action, self.getBoardSize())
+        if player == -1:
+            x, y = y, x # the canonical board of player -1 is transposed
+        return (int(x), int(y))
+
+    def moveToAction(self, move, player):
+        # action on the canonical board of player for the HexBoard coordinates move, inverse of actionToMove
+        x, y = move
+        if player == -1:
+            x, y = y, x
+        return int(np.ravel_multi_index((x, y), self.getBoardSize()))
+
     def getValidMoves(self, canonicalBoard, player):
         # return a fixed size binary vector
         return (canonicalBoard == 0).flatten()
 
+    def getReducedValidMoves(self, canonicalBoard, player):
+        # getValidMoves without the dead and captured cells (see InferiorCells.py)
+        board = self.convertCanonical(np.copy(canonicalBoard), player)
+        valids = np.zeros(self.getActionSize(), dtype=bool)
+        for move in reduced_moves(board):
+            valids[self.moveToAction(move, player)] = True
+        return valids
+
     def getGameEnded(self, board, player):
         if type(board) == np.ndarray: # a canonical board is passed through
             board = self.convertCanonical(board, player) 
@@ -48,18 +83,45 @@ class HexGame(Game):
         elif board.check_win(board.RED):
             return -1 * player # red is player -1
 
+    def getSolver(self, max_empty, node_budget=10000):
+        # endgame solver for getSolvedResult
+        return Solver(node_budget=node_budget, max_empty=max_empty)
+
+    def getSolvedResult(self, canonicalBoard, player, solver):
+        # getGameEnded for the exact result of the position, 0 if the solver could not decide it
+        if solver.max_empty is not None and np.count_nonzero(canonicalBoard == 0) > solver.max_empty:
+            return 0
+        board = self.convertCanonical(np.copy(canonicalBoard), player)
+        winner = solver.solve(board, board.BLUE if player == 1 else board.RED)
+        if winner == board.BLUE:
+            return 1 * player
+        elif winner == board.RED:
+            return -1 * player
+        return 0
+
+    def getGameEndedVC(self, board, player):
+        # getGameEnded, but a position one color has virtually connected (see VirtualConnections.py) is already won
+        if type(board) == np.ndarray: # a canonical board is passed through
+            board = self.convertCanonical(board, player)
+
+        ended = self.getGameEnded(board, player)
+        if ended != 0:
+            return ended
+        winner = decided(board)
+        if winner == board.BLUE:
+            return 1 * player
+        elif winner == board.RED:
+            return -1 * player
+        return 0
+
     def getCanonicalForm(self, board, player):
         # return state if player==1, else return -state if player==-1
         canonicalBoard = np.zeros(self.getBoardSize())
 
-        for c in board.board:
-            x, y = c
-            if board.board[c] == board.BLUE :
-                canonicalBoard[x,y] = 1
-            elif board.board[c] == board.RED :
-                canonicalBoard[x,y] = -1
-            else:
-                canonicalBoard[x,y] = 0
+        # HexBoard keeps its cells in x major order, so the values fill the array row by row
+        cells = np.fromiter(board.board.values(), dtype=np.int8, count=self.n*self.n).reshape(self.getBoardSize())
+        canonicalBoard[cells == board.BLUE] = 1
+        canonicalBoard[cells == board.RED] = -1
         
         if player == -1:
             canonicalBoard = canonicalBoard.T # make sure they always move in same direction
@@ -97,7 +159,30 @@ class HexGame(Game):
         return l
 
     def stringRepresentation(self, canonicalBoard):
-        return canonicalBoard.tostring()
+        # 2 bits per cell: one bitplane for +1 stones and one for -1 stones
+        return np.packbits(np.stack((canonicalBoard > 0, canonicalBoard < 0))).tobytes()
+
+    def getZobristKey(self, canonicalBoard):
+        """
+        Zobrist key of a canonical board. The key is a pair (h, hT), where hT is
+        the key of the board as the opponent sees it (transposed and negated),
+        so that getNextZobristKey can update it without rebuilding the board.
+        """
+        h, hT = 0, 0
+        for i, c in enumerate(canonicalBoard.flatten()):
+            if c != 0:
+                stone = 0 if c > 0 else 1
+                h ^= self.zobrist[i][stone]
+                hT ^= self.zobristT[i][stone]
+        return (h, hT)
+
+    def getNextZobristKey(self, key, action):
+        """
+        Key of getCanonicalForm(*getNextState(canonicalBoard, player, action))
+        given key = getZobristKey(canonicalBoard).
+        """
+        h, hT = key
+        return (hT ^ self.zobristT[action][0], h ^ self.zobrist[action][0])
 
     def _dijkstra_distance(self, board, color):
         """
@@ -0,0 +1,129 @@
+"""
+Inferior cell analysis of Hex positions.
+
+A cell is dead if no stone on it can ever change the outcome: for both
+colors, every two cells around it that the color could still use are
+already next to each other, or joined by a run of that color's stones
+along the ring of neighbours. Two adjacent empty cells are captured by a
+color if its stone on either one makes the other dead, so that color can
+answer any intrusion in one by playing the other.
+
+Dead and captured cells are filled in (dead cells with any color, captured
+ones with their owner) until nothing changes. Playing on a filled-in cell
+never helps the player to move, so the remaining empty cells are the
+reduced move set.
+"""
+from .HexBoard import HexBoard
+
+# the neighbour directions in ring order, every two consecutive ones are adjacent
+RING = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
+BOTH = 0 # the off-board corner where the two edges meet counts for both colors
+
+
+def _ring(cells, size, cell):
+    """the contents of the six neighbours of cell in ring order, edges as stones of their color"""
+    x, y = cell
+    ring = []
+    for dx, dy in RING:
+        nx, ny = x + dx, y + dy
+        x_out, y_out = not 0 <= nx < size, not 0 <= ny < size
+        if x_out and y_out:
+            ring.append(BOTH)
+        elif x_out:
+            ring.append(HexBoard.BLUE)
+        elif y_out:
+            ring.append(HexBoard.RED)
+        else:
+            ring.append(cells[nx, ny])
+    return ring
+
+
+def _useless_for(ring, color):
+    """checks that no two cells color can use around the ring need the center cell to meet"""
+    opponent = HexBoard.RED if color == HexBoard.BLUE else HexBoard.BLUE
+    own = [c == color or c == BOTH for c in ring]
+    usable = [i for i in range(6) if ring[i] != opponent]
+    for a in usable:
+        for b in usable:
+            if b <= a + 1 or (a == 0 and b == 5):
+                continue # the same or ring neighbours
+            # one of the two arcs from a to b has to be all stones of color
+            if not (all(own[a+1:b]) or all(own[b+1:] + own[:a])):
+                return False
+    return True
+
+
+def is_dead(cells, size, cell):
+    """checks if the empty cell is dead"""
+    ring = _ring(cells, size, cell)
+    return _useless_for(ring, HexBoard.BLUE) and _useless_for(ring, HexBoard.RED)
+
+
+def _neighbors(size, cell):
+    x, y = cell
+    return [(x + dx, y + dy) for dx, dy in RING if 0 <= x + dx < size and 0 <= y + dy < size]
+
+
+def captured_pairs(cells, size, color):
+    """
+    Returns:
+        pairs: the adjacent pairs of empty cells captured by color
+    """
+    pairs = []
+    for a, value in cells.items():
+        if value != HexBoard.EMPTY:
+            continue
+        for b in _neighbors(size, a):
+            if b <= a or cells[b] != HexBoard.EMPTY:
+                continue
+            cells[a] = color
+            captured = is_dead(cells, size, b)
+            cells[a] = HexBoard.EMPTY
+            if captured:
+                cells[b] = color
+                captured = is_dead(cells, size, a)
+                cells[b] = HexBoard.EMPTY
+            if captured:
+                pairs.append((a, b))
+    return pairs
+
+
+def fill_in(board):
+    """
+    Fills in the dead and captured cells of board until nothing changes.
+
+    Returns:
+        cells: a copy of the board cells with the inferior cells filled in
+        inferior: {cell: 'dead' or 'captured'} for the filled in cells
+    """
+    cells = dict(board.board)
+    size = board.size
+    inferior = {}
+    changed = True
+    while changed:
+        changed = False
+        for cell, value in cells.items():
+            if value == HexBoard.EMPTY and is_dead(cells, size, cell):
+                cells[cell] = HexBoard.BLUE # the color of a dead cell does not matter
+                inferior[cell] = 'dead'
+                changed = True
+        for color in (HexBoard.BLUE, HexBoard.RED):
+            for a, b in captured_pairs(cells, size, color):
+                if cells[a] == HexBoard.EMPTY and cells[b] == HexBoard.EMPTY:
+                    cells[a] = cells[b] = color
+                    inferior[a] = inferior[b] = 'captured'
+                    changed = True
+    return cells, inferior
+
+
+def reduced_moves(board):
+    """
+    Returns:
+        moves: the moves of board.get_move_list that are not inferior, or one
+               of them if every empty cell is inferior (the game is decided)
+    """
+    moves = board.get_move_list()
+    if not moves:
+        return moves
+    _, inferior = fill_in(board)
+    return [m for m in moves if m not in inferior] or moves[:1]
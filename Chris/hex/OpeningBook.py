@@ -0,0 +1,181 @@
+"""
+Opening book with the search statistics of the first plies of Hex.
+
+Build it offline (from the Chris folder), with the UCT MCTS player or with
+the AlphaZero search of a trained network:
+    python -m hex.OpeningBook --size 7 --plies 3 --width 3 --iters 20000 --out book7.npy
+    python -m hex.OpeningBook --size 7 --plies 4 --sims 2000 --checkpoint temp temp --out book7.npy
+
+Every book position gets a deep search, all actions it visited are stored,
+and its width most visited actions are expanded to the next ply. The book
+is one .npy array of (key, action, visits, value) rows sorted by key, where
+key is a 64 bit hash of the canonical position and value is the search
+value of the action for the player to move. It is memory-mapped when it is
+loaded and looked up with a binary search.
+"""
+import argparse
+import hashlib
+
+import numpy as np
+
+from .HexBoard import HexBoard
+from .HexGame import HexGame
+
+BOOK_DTYPE = np.dtype([('key', '<u8'), ('action', '<u2'), ('visits', '<u4'), ('value', '<f4')])
+
+
+def position_key(game, canonicalBoard):
+    """64 bit key of a canonical board, the board size included"""
+    digest = hashlib.blake2b(bytes([game.n]) + game.stringRepresentation(canonicalBoard), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class OpeningBook():
+    """read-only, memory-mapped opening book, see the module docstring"""
+    def __init__(self, filename):
+        self.entries = np.load(filename, mmap_mode='r')
+        self.keys = self.entries['key']
+        self.games = {}
+
+    def lookup(self, game, canonicalBoard):
+        """
+        Returns:
+            entries: the (key, action, visits, value) rows of canonicalBoard,
+                     empty if it is not in the book
+        """
+        key = np.uint64(position_key(game, canonicalBoard))
+        lo = np.searchsorted(self.keys, key, side='left')
+        hi = np.searchsorted(self.keys, key, side='right')
+        return self.entries[lo:hi]
+
+    def probs(self, game, canonicalBoard, temp=1):
+        """
+        Returns:
+            probs: a policy vector proportional to the book visits**(1/temp),
+                   as MCTS.getActionProb, or None if the position is not in the book
+        """
+        entries = self.lookup(game, canonicalBoard)
+        if len(entries) == 0:
+            return None
+        counts = np.zeros(game.getActionSize())
+        counts[entries['action']] = entries['visits']
+        if temp == 0:
+            probs = np.zeros(len(counts))
+            probs[np.argmax(counts)] = 1
+            return probs
+        counts = counts ** (1. / temp)
+        return counts / np.sum(counts)
+
+    def best_action(self, game, canonicalBoard):
+        """returns the most visited book action of canonicalBoard, or None if it is not in the book"""
+        entries = self.lookup(game, canonicalBoard)
+        if len(entries) == 0:
+            return None
+        return int(entries['action'][np.argmax(entries['visits'])])
+
+    def move(self, board, color):
+        """returns the book move of color on the HexBoard board, or None if it is not in the book"""
+        if board.size not in self.games:
+            self.games[board.size] = HexGame(board.size)
+        game = self.games[board.size]
+        player = 1 if color == HexBoard.BLUE else -1
+        action = self.best_action(game, game.getCanonicalForm(board, player))
+        if action is None:
+            return None
+        return game.actionToMove(action, player)
+
+
+def load_book(book):
+    """returns book, or the OpeningBook stored in it if it is a file name"""
+    if isinstance(book, str):
+        return OpeningBook(book)
+    return book
+
+
+def play_book_move(book, board, color):
+    """places the book move of color on board, returns False if there is none"""
+    if book is None:
+        return False
+    move = book.move(board, color)
+    if move is None:
+        return False
+    board.place(move, color)
+    return True
+
+
+def build(game, search, plies, width):
+    """
+    Searches every position of the first plies, expanding the width most
+    visited moves of each. search(board, color) returns {move: (visits, value)}
+    for color to move on the HexBoard board.
+
+    Returns:
+        entries: the book rows, sorted by key
+    """
+    rows = []
+    seen = set()
+    frontier = [(game.getInitBoard(), HexBoard.BLUE)]
+    for ply in range(plies):
+        next_frontier = []
+        for board, color in frontier:
+            player = 1 if color == HexBoard.BLUE else -1
+            key = position_key(game, game.getCanonicalForm(board, player))
+            if key in seen:
+                continue
+            seen.add(key)
+            stats = search(board, color)
+            for move, (visits, value) in stats.items():
+                rows.append((key, game.moveToAction(move, player), visits, value))
+            for move in sorted(stats, key=lambda m: stats[m][0], reverse=True)[:width]:
+                child = board.clone()
+                child.place(move, color)
+                if not child.is_game_over():
+                    next_frontier.append((child, board.get_opposite_color(color)))
+        frontier = next_frontier
+        print(f"ply {ply}: {len(seen)} positions, {len(rows)} entries")
+    return np.sort(np.array(rows, dtype=BOOK_DTYPE), order=['key', 'action'])
+
+
+def uct_search(iters, C_p=2):
+    """book search with iters iterations of the UCT MCTS player"""
+    from .Player import MCTS
+    def search(board, color):
+        rootnode = MCTS(C_p=C_p)._build_tree(board, color, max_iter=iters)
+        return {child.move: (child.n, child.wi / child.n) for child in rootnode.child_nodes}
+    return search
+
+
+def az_search(n, sims, load_folder, load_name):
+    """book search with sims AlphaZero MCTS simulations of the network in load_folder/load_name"""
+    from .Player import load_model, MCTS_A0
+    from utils import dotdict
+    game = HexGame(n)
+    nnet = load_model(n, load_folder, load_name)
+    def search(board, color):
+        player = 1 if color == HexBoard.BLUE else -1
+        mcts = MCTS_A0(game, nnet, dotdict({'numMCTSSims': sims, 'cpuct': 1.0}))
+        canonicalBoard = game.getCanonicalForm(board, player)
+        mcts.getActionProb(canonicalBoard, player)
+        s = mcts.positionKey(canonicalBoard, player)
+        return {game.actionToMove(a, player): (visits, float(mcts.Qsa[s][a])) for a, visits in mcts.Nsa[s].items()}
+    return search
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="build an opening book from deep searches")
+    parser.add_argument('--size', type=int, default=7)
+    parser.add_argument('--plies', type=int, default=3, help="number of plies in the book")
+    parser.add_argument('--width', type=int, default=3, help="moves expanded per book position")
+    parser.add_argument('--iters', type=int, default=20000, help="iterations of the UCT MCTS search")
+    parser.add_argument('--sims', type=int, default=2000, help="simulations of the AlphaZero search")
+    parser.add_argument('--checkpoint', nargs=2, default=None, metavar=('FOLDER', 'NAME'),
+                        help="network to search with AlphaZero MCTS instead of UCT MCTS")
+    parser.add_argument('--out', default='book.npy')
+    opts = parser.parse_args()
+
+    if opts.checkpoint:
+        search = az_search(opts.size, opts.sims, *opts.checkpoint)
+    else:
+        search = uct_search(opts.iters)
+    entries = build(HexGame(opts.size), search, opts.plies, opts.width)
+    np.save(opts.out, entries)
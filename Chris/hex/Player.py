@@ -1,17 +1,37 @@
 import numpy as np
+import os
 import time 
 from collections import OrderedDict
 import random
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from .HexGame import HexGame 
-from .keras.NNet import NNetWrapper as NNet
 from .HexBoard import HexBoard
+from .Solver import make_solver
+from .OpeningBook import load_book, play_book_move
+from .InferiorCells import reduced_moves
+from .VirtualConnections import decided
+from .BatchRollout import rollout, connected
+from .Resistance import evaluate_board, evaluate_children
 from utils import *
 
 import sys
 sys.path.append('..')
 from MCTS import MCTS as MCTS_A0
 
+# networks loaded by A0_Players, by (board size, folder, name), so that every checkpoint is loaded once
+_models = {}
+
+def load_model(n, load_folder, load_name):
+    """returns the network for checkpoint load_folder/load_name, loading it only the first time"""
+    key = (n, os.path.abspath(load_folder), load_name)
+    if key not in _models:
+        from .keras.NNet import NNetWrapper as NNet # imports TensorFlow, so only when a network is needed
+        nnet = NNet(HexGame(n))
+        nnet.load_checkpoint(load_folder, load_name)
+        _models[key] = nnet
+    return _models[key]
+
 class OrderedDefaultDict(OrderedDict):
     """ 
     Class for priority queue for the Dijkstra algrorithm. 
@@ -40,6 +60,11 @@ class Player():
         if not self.is_human:
             self.ai.reset()
 
+    def close(self):
+        """frees what the ai keeps running between games, call it when the player is done"""
+        if not self.is_human:
+            self.ai.close()
+
     def set_color(self, color):
         self.color = color
         if not self.is_human:
@@ -64,8 +89,16 @@ class Player():
 
 class Alpha_Beta():
     """class for implementation of the alpha-beta algorithm with iterative deepening and transposition tables"""
-    def __init__(self, heuristic="random", depth=4, id=False, max_time=None):
-        assert (heuristic in ["random", "dijkstra"]), "heuristic must be in: ['random', 'dijkstra']"
+    def __init__(self, heuristic="random", depth=4, id=False, max_time=None, solver=None, book=None, prune=False):
+        """
+        solver (a Solver or a dict of its arguments) replaces the evaluation of
+        leaves it can solve, positions in book (an OpeningBook or its file) are
+        not searched. With prune, dead and captured cells are not searched.
+
+        The resistance heuristic (see Resistance.py) evaluates all children of
+        a node at depth 1 in one batch.
+        """
+        assert (heuristic in ["random", "dijkstra", "resistance"]), "heuristic must be in: ['random', 'dijkstra', 'resistance']"
         assert (type(depth) is int), "depth must be an integer"
 
         if id:
@@ -75,11 +108,18 @@ class Alpha_Beta():
             self.move = self._ai_move
         self.depth = depth
         self.tt = {}
+        self.solver = make_solver(solver)
+        self.book = load_book(book)
+        self._moves = reduced_moves if prune else HexBoard.get_move_list
     
         if heuristic == "random":
             self._evalfunction = self._random_eval
         elif heuristic == "dijkstra":
             self._evalfunction = self._dijkstra_eval
+        elif heuristic == "resistance":
+            self._evalfunction = self._resistance_eval
+        # evaluations of all children of a depth 1 node at once, if the heuristic has them
+        self._batch_evalfunction = self._resistance_children if heuristic == "resistance" else None
 
     def set_color(self, color):
         self.color = color
@@ -87,13 +127,20 @@ class Alpha_Beta():
     def reset(self):
         self.tt = {}
 
+    def close(self):
+        pass
+
     def _ai_move(self, board, debug=False):
+        if play_book_move(self.book, board, self.color):
+            return
         best_move, score = self._alpha_beta(board, self.depth, -np.inf, np.inf, self.color, debug=debug)
         if debug:
             print("DEBUG:", "Best move is {} with value {}".format(best_move, score))
         board.place(best_move, self.color)
     
     def _ai_move_tt_id(self, board):
+        if play_book_move(self.book, board, self.color):
+            return
         best_move, score = self._iterative_deepening(board, max_time =self.max_time)
         board.place(best_move, self.color)
 
@@ -104,6 +151,10 @@ class Alpha_Beta():
         best_move = ''
 
         if depth == 0 or board.is_game_over(): 
+            if self.solver is not None and not board.is_game_over():
+                winner = self.solver.solve(board, color)
+                if winner is not None:
+                    return best_move, np.inf if winner == self.color else -np.inf
             return best_move, self._evalfunction(board)
 
         if transposition_table:
@@ -118,10 +169,15 @@ class Alpha_Beta():
 
         if color == self.color:
             best_score = -np.inf
-            for possible_move in board.get_move_list():
+            moves = self._moves(board)
+            child_scores = self._child_scores(board, depth, moves, self.color)
+            for k, possible_move in enumerate(moves):
                 
                 board.place(possible_move, self.color)
-                _, score = self._alpha_beta(board, depth -1, alpha, beta, board.get_opposite_color(self.color), transposition_table=transposition_table, debug=debug) # next move for opposite player
+                if child_scores is not None:
+                    score = child_scores[k]
+                else:
+                    _, score = self._alpha_beta(board, depth -1, alpha, beta, board.get_opposite_color(self.color), transposition_table=transposition_table, debug=debug) # next move for opposite player
                 if debug:
                     board.print()
                     print("DEBUG:", "depth = {}, Score for this move is {}".format(depth, score))
@@ -142,9 +198,14 @@ class Alpha_Beta():
 
         else:
             best_score = np.inf
-            for possible_move in board.get_move_list(): 
+            moves = self._moves(board)
+            child_scores = self._child_scores(board, depth, moves, board.get_opposite_color(self.color))
+            for k, possible_move in enumerate(moves): 
                 board.place(possible_move, board.get_opposite_color(self.color))
-                _, score = self._alpha_beta(board, depth -1, alpha, beta, self.color, transposition_table=transposition_table, debug=debug) # next move for this player
+                if child_scores is not None:
+                    score = child_scores[k]
+                else:
+                    _, score = self._alpha_beta(board, depth -1, alpha, beta, self.color, transposition_table=transposition_table, debug=debug) # next move for this player
                 if debug:
                     board.print()
                     print("DEBUG:", "depth = {}, Score for this move is {}".format(depth, score))
@@ -194,12 +255,32 @@ class Alpha_Beta():
         print(d)
         return best_move, best_score
 
+    def _child_scores(self, board, depth, moves, mover):
+        """
+        Returns:
+            scores: the evaluations of the children of a depth 1 node, from
+                    _batch_evalfunction, or None if they are searched one by one
+        """
+        if depth != 1 or self._batch_evalfunction is None or self.solver is not None or not moves:
+            return None
+        return self._batch_evalfunction(board, moves, mover)
+
     def _random_eval(self, board):
         return np.random.randint(-board.size, board.size)
     
     def _dijkstra_eval(self, board):
         return  self._dijkstra_distance(board, board.get_opposite_color(self.color)) - self._dijkstra_distance(board, self.color)
 
+    def _resistance_eval(self, board):
+        if board.is_game_over():
+            return np.inf if board.check_win(self.color) else -np.inf
+        return evaluate_board(board, self.color)
+
+    def _resistance_children(self, board, moves, mover):
+        scores, boards = evaluate_children(board, moves, mover, self.color)
+        scores[connected(boards, mover)] = np.inf if mover == self.color else -np.inf # the game over children
+        return scores
+
     def _dijkstra_distance(self, board, color):
         """
         Function which calculates the Dijkstra's shortest path from one side of the board to the other.
@@ -239,23 +320,31 @@ class Alpha_Beta():
 
 class Node():
     """class for Nodes used in the graphs for the MCTS algorithm"""
-    def __init__(self, board, color, C_p=2):
+    def __init__(self, board, color, C_p=2, moves=None, rave=None):
+        """
+        moves are the untried moves of the node, all moves on board if None.
+        rave is None, or the (rave_k, rave_bias) blending schedule of MCTS.
+        """
         
         self.wi = 0
         self.n = 0
+        self.amaf_wi = 0 # results of the playouts in which this move was played later (all moves as first)
+        self.amaf_n = 0
 
         self.C_p = C_p
+        self.rave = rave
 
         self.move = None
         self.parent_node = None
         self.color = color
+        self.solved = None # exact result of the node once the solver decided it
         self.child_nodes = []
-        self.untried_moves = board.get_move_list()
+        self.untried_moves = board.get_move_list() if moves is None else moves
         self.UCT = self._calc_UCT()
 
-    def add_child(self, move, state):
+    def add_child(self, move, state, moves=None):
         """function for adding a child to a node"""
-        child = Node(state, state.get_opposite_color(self.color), C_p=self.C_p) #next move always has opposite color
+        child = Node(state, state.get_opposite_color(self.color), C_p=self.C_p, moves=moves, rave=self.rave) #next move always has opposite color
         child.parent_node = self #current node is the parent
         child.move = move
         self.child_nodes.append(child)
@@ -268,11 +357,26 @@ class Node():
             return np.inf
         if self.parent_node is None: #edge case for the root node which has no parent
             return np.inf
-        return self.wi/self.n + self.C_p * (np.log(self.parent_node.n)/self.n)**0.5
+        value = self.wi/self.n
+        if self.rave is not None and self.amaf_n > 0:
+            beta = self._rave_beta()
+            value = (1 - beta) * value + beta * self.amaf_wi/self.amaf_n
+        return value + self.C_p * (np.log(self.parent_node.n)/self.n)**0.5
+
+    def _rave_beta(self):
+        """weight of the AMAF value, from 1 for a new node down to 0"""
+        rave_k, rave_bias = self.rave
+        if rave_bias is not None: # minimum MSE schedule
+            return self.amaf_n / (self.n + self.amaf_n + 4 * rave_bias**2 * self.n * self.amaf_n)
+        return (rave_k / (3 * self.n + rave_k))**0.5 # equal weight after rave_k visits
     
-    def update(self, result):
-        self.wi += result #+1 for win, -1 for loss, 0 for draw  
-        self.n += 1
+    def update(self, result, count=1):
+        self.wi += result #+1 for win, -1 for loss, 0 for draw, summed over count playouts
+        self.n += count
+
+    def update_amaf(self, result, count=1):
+        self.amaf_wi += result
+        self.amaf_n += count
 
     def UCT_select_child(self):
         """selects the child with the highest UCT score"""
@@ -297,103 +401,283 @@ class Node():
         """prints the information stored in the node"""
         logging.debug(f"move: {self.move}, depth {depth}, UCT: {self._calc_UCT():5.3f}, w: {self.wi:2}, n: {self.n}")
 
+def _search_worker(config, board, color, max_iter, max_time, seed):
+    """builds one tree of a root-parallel MCTS search in a worker process and returns its root statistics"""
+    random.seed(seed)
+    np.random.seed(seed)
+    ai = MCTS(**config)
+    rootnode = ai._build_tree(board, color, max_iter=max_iter, max_time=max_time, C_p=ai.C_p)
+    return ai._root_stats(rootnode)
+
 class MCTS():
     """class for the MCTS AI functions"""
-    def __init__(self, max_iter=None, max_time=None, C_p=2):
+    def __init__(self, max_iter=None, max_time=None, C_p=2, solver=None, book=None, prune=False, vc=False, workers=1,
+                 rave=False, rave_k=1000, rave_bias=None, batch_size=1):
+        """
+        solver (a Solver or a dict of its arguments) is tried on every new
+        node, solved nodes are not played out. Positions in book (an
+        OpeningBook or its file) are not searched. With prune, dead and
+        captured cells are not expanded. With vc, playouts stop as soon as
+        virtual connections decide them.
+
+        With workers > 1 the search is root-parallel: every worker process
+        builds its own tree with the full max_iter or max_time budget and a
+        different seed, and the move with the most visits over all trees is
+        played, ties broken by the summed wins. The pool is kept between moves
+        until close() is called.
+
+        A single tree is kept between moves: the node reached by the last move
+        and the opponent's reply becomes the next root.
+
+        With rave, every playout also updates the all-moves-as-first (AMAF)
+        statistics of the children whose move was played later in it, and
+        these are blended into the node values with weight
+        sqrt(rave_k / (3 n + rave_k)), or with the minimum MSE schedule of
+        Gelly and Silver if rave_bias is given.
+
+        With batch_size > 1 every expanded node gets batch_size playouts at
+        once, played as NumPy random fill-ins (see BatchRollout.py).
+        """
         self.max_iter = max_iter
         self.max_time = max_time
         self.C_p = C_p
+        self.solver = make_solver(solver)
+        self.book = load_book(book)
+        self._moves = reduced_moves if prune else HexBoard.get_move_list
+        self.vc = vc
+        self.workers = workers
+        self.pool = None # started with the first root-parallel search
+        self.rave = (rave_k, rave_bias) if rave else None
+        self.batch_size = batch_size
+        self.config = {'C_p': C_p, 'solver': self.solver, 'prune': prune, 'vc': vc,
+                       'rave': rave, 'rave_k': rave_k, 'rave_bias': rave_bias, 'batch_size': batch_size}
+        self.reset()
 
     def set_color(self, color):
         self.color = color
+        self.reset()
 
     def reset(self):
-        pass
+        self.root = None # tree of the last move
+        self.last_board = None # board cells the tree was built for
+
+    def close(self):
+        """shuts the worker processes of the root-parallel search down"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
 
     def move(self, board):
-        ai = MCTS()
+        if play_book_move(self.book, board, self.color):
+            return
         if self.max_iter is not None:
-            best_move = self._MCTS(board, self.color, max_iter=self.max_iter, C_p=self.C_p)
+            budget = {'max_iter': self.max_iter}
         elif self.max_time is not None:
-            best_move = self._MCTS(board, self.color, max_time=self.max_time, C_p=self.C_p)
+            budget = {'max_time': self.max_time}
+        else:
+            budget = {'max_iter': 1000}
+        if self.workers > 1:
+            best_move = self._parallel_MCTS(board, self.color, **budget)
         else:
-            best_move = self._MCTS(board, self.color, max_iter=1000, C_p=self.C_p)
+            self.root = self._build_tree(board, self.color, C_p=self.C_p, rootnode=self._reuse_root(board), **budget)
+            self.last_board = dict(board.board)
+            best_move = self._best_move(self.root)
         board.place(best_move, self.color)        
 
+    def _reuse_root(self, board):
+        """
+        Finds the node of board in the tree of the last move, from the two
+        moves played since then, and frees the rest of the tree.
+
+        Returns:
+            rootnode: the node, or None if the tree cannot be reused
+        """
+        if self.root is None or len(board.board) != len(self.last_board):
+            return None
+        changed = [c for c, v in board.board.items() if v != self.last_board[c]]
+        if len(changed) != 2 or any(self.last_board[c] != HexBoard.EMPTY for c in changed):
+            return None # not two stones placed on empty cells
+        if {board.board[c] for c in changed} != {self.color, board.get_opposite_color(self.color)}:
+            return None # not one move of each color
+        if board.board[changed[0]] != self.color:
+            changed.reverse() # our move first, then the reply
+        node = self.root
+        for move in changed:
+            node = next((child for child in node.child_nodes if child.move == move), None)
+            if node is None:
+                return None
+        if node.solved is not None:
+            return None # a solved root has no statistics of its children
+        node.parent_node = None
+        return node
+
+    def _parallel_MCTS(self, board, color, max_iter=np.inf, max_time=np.inf):
+        """
+        root-parallel search, returns the move with the most visits summed
+        over the worker trees, and of those the one with the most wins
+        """
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        futures = [self.pool.submit(_search_worker, self.config, board.clone(), color, max_iter, max_time,
+                                    random.getrandbits(32)) for _ in range(self.workers)]
+        visits, wins = {}, {}
+        for future in futures:
+            for move, (n, wi) in future.result().items():
+                visits[move] = visits.get(move, 0) + n
+                wins[move] = wins.get(move, 0) + wi
+        logging.debug(f"merged visits: {visits}, wins: {wins}")
+        return max(visits, key=lambda move: (visits[move], wins[move]))
+
     def _MCTS(self, board, color, max_iter=np.inf, max_time=np.inf, C_p=2):
-        rootnode = Node(board, board.get_opposite_color(color), C_p=C_p)
-        rootnode.n, rootnode.move = 1, "root  "
+        rootnode = self._build_tree(board, color, max_iter=max_iter, max_time=max_time, C_p=C_p)
+        return self._best_move(rootnode)
+
+    def _best_move(self, rootnode):
+        best_child = np.argmax([child._calc_UCT() for child in rootnode.child_nodes])
+        return [child.move for child in rootnode.child_nodes][best_child]
+
+    def _root_stats(self, rootnode):
+        """returns {move: (visits, win total)} of the children of rootnode"""
+        return {child.move: (child.n, child.wi) for child in rootnode.child_nodes}
+
+    def _build_tree(self, board, color, max_iter=np.inf, max_time=np.inf, C_p=2, rootnode=None):
+        """
+        runs the MCTS iterations for color to move on board and returns the
+        root node, continuing the tree of rootnode if it is given
+        """
+        if rootnode is None:
+            rootnode = Node(board, board.get_opposite_color(color), C_p=C_p, moves=self._moves(board), rave=self.rave)
+            rootnode.n, rootnode.move = 1, "root  "
         start_time = time.time()
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG) # the board and tree printing is slow, skip it otherwise
+        us = board.get_opposite_color(rootnode.color)
         i = 0
         while (i < max_iter) and (time.time() - start_time < max_time):
-            logging.debug(f"iteration {i}")
+            if debug:
+                logging.debug(f"iteration {i}")
             node = rootnode
             state = board.clone()
+            played = [] # (move, color) of the simulation, for the AMAF statistics
 
             #select
-            while node.untried_moves == [] and node.child_nodes != []:
-                logging.debug(f"untried moves: {node.untried_moves}")
+            while node.solved is None and node.untried_moves == [] and node.child_nodes != []:
+                if debug:
+                    logging.debug(f"untried moves: {node.untried_moves}")
                 node = node.UCT_select_child()
                 state.place(node.move, node.color)
+                played.append((node.move, node.color))
             
-            logging.debug("selected state:")
-            state.print(level='debug')
+            if debug:
+                logging.debug("selected state:")
+                state.print(level='debug')
 
             #expand
-            if node.untried_moves != []:
-                logging.debug(f"untried moves: {node.untried_moves}")
+            if node.solved is None and node.untried_moves != []:
+                if debug:
+                    logging.debug(f"untried moves: {node.untried_moves}")
                 move = random.choice(node.untried_moves)
                 state.place(move, state.get_opposite_color(node.color))
-                node = node.add_child(move, state)
-                logging.debug(f"expanding {move} with color {node.color} ")
+                node = node.add_child(move, state, moves=self._moves(state))
+                played.append((move, node.color))
+                if debug:
+                    logging.debug(f"expanding {move} with color {node.color} ")
+                if self.solver is not None:
+                    winner = self.solver.solve(state, state.get_opposite_color(node.color))
+                    if winner is not None:
+                        node.solved = 1 if winner == state.get_opposite_color(rootnode.color) else -1
                 
             
-            logging.debug("expanded state:")
-            state.print(level="debug")
+            if debug:
+                logging.debug("expanded state:")
+                state.print(level="debug")
 
             #playout
+            depth = len(played) # of node below rootnode
             color = node.color
-            while state.get_move_list() != []:
+            winner = None
+            count, filled = 1, None
+            if self.batch_size > 1 and node.solved is None and not state.is_game_over():
+                filled, filled_winners = rollout(state, state.get_opposite_color(node.color), self.batch_size)
+                signs = np.where(filled_winners == us, 1, -1)
+                count = self.batch_size
+            while filled is None and node.solved is None and state.get_move_list() != []:
+                if self.vc:
+                    winner = decided(state)
+                    if winner is not None:
+                        break
                 color = state.get_opposite_color(color)
                 m = random.choice(state.get_move_list())
-                logging.debug(f"random move: {m} node color: {node.color} color: {color}" )
+                if debug:
+                    logging.debug(f"random move: {m} node color: {node.color} color: {color}" )
                 state.place(m , color)   
+                played.append((m, color))
             
-            logging.debug("state after rollout")
-            state.print(level="debug")
+            if debug:
+                logging.debug("state after rollout")
+                state.print(level="debug")
 
             #backpropagate
-            if state.check_win(state.get_opposite_color(rootnode.color)):
+            if node.solved is not None:
+                result = node.solved
+            elif filled is not None:
+                result = int(signs.sum())
+            elif winner is not None:
+                result = 1 if winner == state.get_opposite_color(rootnode.color) else -1
+            elif state.check_win(state.get_opposite_color(rootnode.color)):
                 result = 1
             elif state.check_win(rootnode.color):
                 result = -1
             else: 
                 result = 0
 
+            later = dict(played[depth:]) # moves played after the position of node
             while node != None:
-                node.update(result)
+                node.update(result, count)
+                if self.rave is not None:
+                    for child in node.child_nodes:
+                        if child.move in later:
+                            if later[child.move] == child.color:
+                                child.update_amaf(result, count)
+                        elif filled is not None: # the move was played in the fill-ins where its cell has the child's color
+                            hits = filled[:, child.move[0], child.move[1]] == child.color
+                            child.update_amaf(int(signs[hits].sum()), int(hits.sum()))
+                    if depth > 0:
+                        depth -= 1
+                        later[played[depth][0]] = played[depth][1]
                 node = node.parent_node
             
             i += 1
-            rootnode.print_tree()
-        best_child = np.argmax([child._calc_UCT() for child in rootnode.child_nodes])
-        return [child.move for child in rootnode.child_nodes][best_child]
+            if debug:
+                rootnode.print_tree()
+        return rootnode
 
 class A0_Player():
     """
     Alpha-zero player class for hex. 
     """
-    def __init__(self, n, load_folder="temp", load_name="temp"):
+    def __init__(self, n, load_folder="temp", load_name="temp", num_sims=50, max_time=None, min_sims=10,
+                 solver_max_empty=None, solver_budget=10000, book=None):
+        """
+        Plays num_sims MCTS simulations per move, or, if max_time is given,
+        searches for up to max_time seconds per move with at least min_sims
+        simulations. With solver_max_empty, positions with at most that many
+        empty cells are solved exactly during the search. Positions in book
+        (an OpeningBook or its file) are played from the book.
+        """
         self.game = HexGame(n)
-        n1 = NNet(self.game)
-        n1.load_checkpoint(load_folder,load_name) # TODO Make most recent
+        n1 = load_model(n, load_folder, load_name) # TODO Make most recent
         
-        args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
+        args1 = dotdict({'numMCTSSims': num_sims, 'cpuct':1.0, 'timeBudget': max_time, 'minSims': min_sims,
+                         'solverMaxEmpty': solver_max_empty, 'solverBudget': solver_budget})
         mcts1 = MCTS_A0(self.game, n1, args1)
         self.n1p = lambda x, player: np.argmax(mcts1.getActionProb(x, temp=0, player=player))
+        self.book = load_book(book)
 
     def reset(self):
         pass
+
+    def close(self):
+        pass
         
     def set_color(self, color):
         self.color = color
@@ -404,7 +688,7 @@ class A0_Player():
 
     def move(self, board):
         canonicalBoard = self.game.getCanonicalForm(board, self.player)
-        action = self.n1p(canonicalBoard, self.player)
-        newBoard, next_player = self.game.getNextState(canonicalBoard, self.player, action)
-        board.board = newBoard.board
-        board.game_over = newBoard.game_over
\ No newline at end of file
+        action = self.book.best_action(self.game, canonicalBoard) if self.book is not None else None
+        if action is None:
+            action = self.n1p(canonicalBoard, self.player)
+        board.place(self.game.actionToMove(action, self.player), self.color)
\ No newline at end of file
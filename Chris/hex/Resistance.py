@@ -0,0 +1,95 @@
+"""
+Electrical resistance evaluation of Hex positions.
+
+For each color the board is turned into a circuit between its two edges:
+every cell has a resistance (1 if empty, almost 0 for a stone of the color,
+infinite for an opponent stone), two neighbouring cells are joined by a
+resistor of the sum of their resistances, and the edges are joined to the
+cells next to them. The effective resistance between the edges counts all
+routes of the color at once, not only the shortest one like the Dijkstra
+distance. The evaluation of a position for a color is log(R_opponent / R_color).
+
+All functions take a batch of boards as a B x n x n array of HexBoard colors
+(see BatchRollout.board_array) and solve the B circuits with one batched
+np.linalg.solve.
+"""
+import numpy as np
+
+from .HexBoard import HexBoard
+from .BatchRollout import DIRECTIONS, board_array
+
+STONE = 1e-4 # resistance of a stone of the color, 0 would short-circuit neighbouring stones
+LEAK = 1e-9 # conductance of every node to the far edge, so that cut off cells keep the system solvable
+
+_circuits = {}
+
+
+def _circuit(n):
+    """returns the incidence matrices of the cell pairs and of the two edges (x = 0 and x = n-1) of an n x n board"""
+    if n not in _circuits:
+        pairs = [(x * n + y, (x + dx) * n + y + dy) for x in range(n) for y in range(n) for dx, dy in DIRECTIONS
+                 if 0 <= x + dx < n and 0 <= y + dy < n and x * n + y < (x + dx) * n + y + dy]
+        I, J = np.array(pairs).T
+        incidence = np.zeros((len(pairs), n * n))
+        incidence[np.arange(len(pairs)), I] = 1
+        incidence[np.arange(len(pairs)), J] = 1
+        _circuits[n] = I, J, incidence, np.arange(n), np.arange((n - 1) * n, n * n)
+    return _circuits[n]
+
+
+def resistance(boards, color):
+    """
+    Returns:
+        R: the effective resistance between the two edges of color, for every
+           board of the batch
+    """
+    B, n, _ = boards.shape
+    if color == HexBoard.RED:
+        boards = boards.transpose(0, 2, 1) # a symmetry of the board that swaps the edges
+    I, J, incidence, first, last = _circuit(n)
+    r = np.where(boards == HexBoard.EMPTY, 1.0, np.where(boards == color, STONE, np.inf)).reshape(B, n * n)
+    g = 1 / (r[:, I] + r[:, J])
+    g_first, g_last = 1 / r[:, first], 1 / r[:, last]
+
+    # Laplacian of the cells and the first edge (the last node), with the far edge grounded
+    source = n * n
+    L = np.zeros((B, n * n + 1, n * n + 1))
+    L[:, I, J] = -g
+    L[:, J, I] = -g
+    L[:, source, first] = -g_first
+    L[:, first, source] = -g_first
+    degree = np.zeros((B, n * n + 1))
+    degree[:, :n * n] = g @ incidence
+    degree[:, first] += g_first
+    degree[:, last] += g_last
+    degree[:, source] = g_first.sum(axis=1)
+    diagonal = np.arange(n * n + 1)
+    L[:, diagonal, diagonal] = degree + LEAK
+
+    current = np.zeros((B, n * n + 1, 1))
+    current[:, source] = 1
+    return np.linalg.solve(L, current)[:, source, 0]
+
+
+def evaluate(boards, color):
+    """returns log(R_opponent / R_color) of every board of the batch, positive if color is ahead"""
+    opponent = HexBoard.RED if color == HexBoard.BLUE else HexBoard.BLUE
+    return np.log(resistance(boards, opponent) / resistance(boards, color))
+
+
+def evaluate_board(board, color):
+    """evaluate for a single HexBoard"""
+    return float(evaluate(board_array(board)[None], color)[0])
+
+
+def evaluate_children(board, moves, mover, color):
+    """
+    Returns:
+        evaluations: evaluate for color of the boards after each of the moves
+                     of mover on board, computed as one batch
+        boards: that batch of boards, for other batched checks of the children
+    """
+    boards = np.repeat(board_array(board)[None], len(moves), axis=0)
+    x, y = np.array(moves).T
+    boards[np.arange(len(moves)), x, y] = mover
+    return evaluate(boards, color), boards
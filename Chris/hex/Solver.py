@@ -0,0 +1,168 @@
+from .HexBoard import HexBoard
+
+INF = float('inf')
+
+class PNNode():
+    """node of the proof-number search tree"""
+    __slots__ = ('move', 'parent', 'children', 'is_or', 'pn', 'dn')
+
+    def __init__(self, move, parent, is_or):
+        self.move = move
+        self.parent = parent
+        self.children = None # None until expanded
+        self.is_or = is_or # True if the attacker (the player to move at the root) is to move
+        self.pn = 1
+        self.dn = 1
+
+class Solver():
+    """
+    Proof-number search solver for HexBoard positions.
+
+    solve(board, color) proves or disproves that color, the player to move,
+    wins. The search gives up after node_budget nodes, and positions with more
+    than max_empty empty cells are not tried at all. Every position that is
+    solved along the way is stored in a cache shared by all calls, so repeated
+    calls from a search are mostly cache hits.
+    """
+    def __init__(self, node_budget=10000, max_empty=None, cache_size=1000000):
+        self.node_budget = node_budget
+        self.max_empty = max_empty
+        self.cache_size = cache_size
+        self.cache = {} # (cells, color to move) -> winning color
+        self.neighbors = {}
+
+    def reset(self):
+        self.cache = {}
+
+    def _key(self, board, color):
+        return tuple(board.board.values()), color
+
+    def _get_neighbors(self, board):
+        if board.size not in self.neighbors:
+            self.neighbors[board.size] = {c: board.get_neighbors(c) for c in board.board}
+        return self.neighbors[board.size]
+
+    def _won(self, cells, size, neighbors, color):
+        """checks if color connects its two edges, with one flood fill from its first edge"""
+        if color == HexBoard.BLUE:
+            stack = [(0, i) for i in range(size) if cells[0, i] == color]
+        else:
+            stack = [(i, 0) for i in range(size) if cells[i, 0] == color]
+        seen = set(stack)
+        while stack:
+            c = stack.pop()
+            if c[0 if color == HexBoard.BLUE else 1] == size - 1:
+                return True
+            for nb in neighbors[c]:
+                if nb not in seen and cells[nb] == color:
+                    seen.add(nb)
+                    stack.append(nb)
+        return False
+
+    def _must_play(self, cells, size, neighbors, moves, color):
+        """
+        Returns:
+            moves: the moves of color worth trying; if color has no winning
+                   move but the opponent has, color has to block it
+        """
+        opponent = HexBoard.RED if color == HexBoard.BLUE else HexBoard.BLUE
+        threats = []
+        for move in moves:
+            cells[move] = color
+            won = self._won(cells, size, neighbors, color)
+            cells[move] = opponent
+            if won:
+                cells[move] = HexBoard.EMPTY
+                return [move]
+            if self._won(cells, size, neighbors, opponent):
+                threats.append(move)
+            cells[move] = HexBoard.EMPTY
+        return threats or moves
+
+    def solve(self, board, color):
+        """
+        Returns:
+            winner: the color that wins board with color to move, or None if
+                    the position was not solved within the node budget
+        """
+        if board.check_win(HexBoard.BLUE):
+            return HexBoard.BLUE
+        if board.check_win(HexBoard.RED):
+            return HexBoard.RED
+        empty = [c for c, v in board.board.items() if v == HexBoard.EMPTY]
+        if self.max_empty is not None and len(empty) > self.max_empty:
+            return None
+        key = self._key(board, color)
+        if key in self.cache:
+            return self.cache[key]
+        if len(self.cache) > self.cache_size:
+            self.cache = {}
+
+        work = board.clone()
+        cells, size = work.board, work.size
+        neighbors = self._get_neighbors(work)
+        attacker, defender = color, work.get_opposite_color(color)
+        root = PNNode(None, None, True)
+        nodes = 1
+
+        while root.pn != 0 and root.dn != 0 and nodes < self.node_budget:
+            # select the most proving node, playing its moves on the work board
+            node, to_move = root, attacker
+            while node.children is not None:
+                if node.is_or:
+                    node = min(node.children, key=lambda c: c.pn)
+                else:
+                    node = min(node.children, key=lambda c: c.dn)
+                cells[node.move] = to_move
+                to_move = defender if to_move == attacker else attacker
+
+            # expand it, a child that completes a chain is decided right away
+            node.children = []
+            moves = [c for c, v in cells.items() if v == HexBoard.EMPTY]
+            for move in self._must_play(cells, size, neighbors, moves, to_move):
+                child = PNNode(move, node, not node.is_or)
+                cells[move] = to_move
+                winner = self._won(cells, size, neighbors, to_move) and to_move
+                if not winner:
+                    winner = self.cache.get((tuple(cells.values()), attacker if child.is_or else defender))
+                cells[move] = HexBoard.EMPTY
+                if winner == attacker:
+                    child.pn, child.dn = 0, INF
+                elif winner == defender:
+                    child.pn, child.dn = INF, 0
+                elif child.is_or: # initialise by mobility, more replies are harder to refute
+                    child.dn = len(moves) - 1
+                else:
+                    child.pn = len(moves) - 1
+                node.children.append(child)
+                if winner == to_move:
+                    break # one winning move decides the node
+            nodes += len(node.children)
+
+            # update the proof and disproof numbers back to the root, undoing the moves
+            while node is not None:
+                if node.is_or:
+                    node.pn = min(c.pn for c in node.children)
+                    node.dn = sum(c.dn for c in node.children)
+                else:
+                    node.pn = sum(c.pn for c in node.children)
+                    node.dn = min(c.dn for c in node.children)
+                if node.pn == 0 or node.dn == 0:
+                    node.children = [] # solved, the subtree is not needed anymore
+                    to_move_here = attacker if node.is_or else defender
+                    self.cache[(tuple(cells.values()), to_move_here)] = attacker if node.pn == 0 else defender
+                if node.move is not None:
+                    cells[node.move] = HexBoard.EMPTY
+                node = node.parent
+
+        if root.pn == 0:
+            return attacker
+        if root.dn == 0:
+            return defender
+        return None
+
+def make_solver(solver):
+    """returns solver, or a Solver built from it if it is a dict of Solver arguments (as in a tournament config)"""
+    if isinstance(solver, dict):
+        return Solver(**solver)
+    return solver
@@ -0,0 +1,127 @@
+"""
+Headless, parallel version of Game.tournament.
+
+Usage (from the Chris folder):
+    python -m hex.Tournament hex/tournament_example.json
+
+The config is a JSON file with the board size, the number of rounds, the
+number of worker processes, an output prefix and the agents, each with a
+unique name, an agent from hex.Agents and its keyword arguments:
+
+    {"size": 7, "rounds": 10, "workers": 4, "output": "tournament",
+     "agents": [{"name": "ab3", "agent": "alphabeta", "kwargs": {"heuristic": "dijkstra", "depth": 3}},
+                {"name": "mcts", "agent": "mcts", "kwargs": {"max_time": 1.0}}]}
+
+As in Game.tournament, every round pairs the agents in a random order and
+every agent plays two games. All games are run in a process pool and the
+TrueSkill ratings are updated in the order the games finish. Every game is
+appended to <output>_games.csv and the ratings after it to
+<output>_ratings.jsonl.
+"""
+import csv
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from trueskill import Rating, rate_1vs1
+
+from .Agents import make_agent
+from .Game_a2 import Game
+
+# agents made in this worker process, by name, reused between games like in Game.tournament
+# (closed after every game, so that no process the agent started outlives the tournament)
+_agents = {}
+
+
+def _get_agent(spec):
+    if spec['name'] not in _agents:
+        _agents[spec['name']] = make_agent(spec['agent'], **spec.get('kwargs', {}))
+    return _agents[spec['name']]
+
+
+def play_match(size, blue, red, seed):
+    """
+    Plays one game between the agent specs blue (who starts) and red.
+
+    Returns:
+        outcome: 0 if blue won, 1 if red won, 2 for a draw (as Game.play_game)
+        duration: seconds the game took
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    players = (_get_agent(blue), _get_agent(red))
+    start = time.time()
+    outcome = Game(size).play_game(players, verbose=False)
+    for p in players:
+        p.reset()
+        p.close() # stops worker processes of the agent, its next game starts them again
+    return outcome, time.time() - start
+
+
+def schedule(n_agents, n_rounds, seed=None):
+    """returns the (round, blue, red) agent indices of every game, paired as in Game.tournament"""
+    rng = np.random.RandomState(seed)
+    games = []
+    for n in range(n_rounds):
+        order = rng.permutation(n_agents)
+        for i in range(n_agents):
+            games.append((n, order[i], order[(i+1) % n_agents]))
+    return games
+
+
+def run(config):
+    """
+    Plays the tournament described by config.
+
+    Returns:
+        ratings: dict from agent name to its final TrueSkill Rating
+    """
+    agents = config['agents']
+    names = [a['name'] for a in agents]
+    assert len(set(names)) == len(names), "agent names must be unique"
+    size = config.get('size', 7)
+    output = config.get('output', 'tournament')
+    seed = config.get('seed', None)
+
+    ratings = [Rating() for _ in agents]
+    games = schedule(len(agents), config.get('rounds', 1), seed)
+    seeds = np.random.RandomState(seed).randint(2**31, size=len(games))
+
+    with open(output + "_games.csv", "w", newline="") as games_file, \
+            open(output + "_ratings.jsonl", "w") as ratings_file, \
+            ProcessPoolExecutor(max_workers=config.get('workers', None)) as pool:
+        writer = csv.writer(games_file)
+        writer.writerow(["finished", "game", "round", "blue", "red", "outcome", "seconds",
+                         "blue_mu", "blue_sigma", "red_mu", "red_sigma"])
+        futures = {pool.submit(play_match, size, agents[p1], agents[p2], int(s)): (k, n, p1, p2)
+                   for k, ((n, p1, p2), s) in enumerate(zip(games, seeds))}
+
+        for finished, future in enumerate(as_completed(futures)):
+            k, n, p1, p2 = futures[future]
+            outcome, seconds = future.result()
+            if outcome == 0:
+                ratings[p1], ratings[p2] = rate_1vs1(ratings[p1], ratings[p2])
+            elif outcome == 1:
+                ratings[p2], ratings[p1] = rate_1vs1(ratings[p2], ratings[p1])
+            elif outcome == 2:
+                ratings[p1], ratings[p2] = rate_1vs1(ratings[p1], ratings[p2], drawn=True)
+
+            writer.writerow([finished, k, n, names[p1], names[p2], ["blue", "red", "draw"][outcome], f"{seconds:.3f}",
+                             ratings[p1].mu, ratings[p1].sigma, ratings[p2].mu, ratings[p2].sigma])
+            games_file.flush()
+            ratings_file.write(json.dumps({'finished': finished, 'game': k,
+                                           'ratings': {name: [r.mu, r.sigma] for name, r in zip(names, ratings)}}) + "\n")
+            ratings_file.flush()
+            print(f"{finished + 1}/{len(games)}: {names[p1]} vs {names[p2]}: {['blue wins', 'red wins', 'draw'][outcome]}")
+
+    return dict(zip(names, ratings))
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as f:
+        config = json.load(f)
+    for name, rating in sorted(run(config).items(), key=lambda x: -x[1].mu):
+        print(f"{name:>20} mu {rating.mu:6.2f} sigma {rating.sigma:5.2f}")
@@ -0,0 +1,123 @@
+"""
+Virtual connections of Hex positions.
+
+Two groups of a color are virtually connected if they can be joined even
+when the opponent moves first. This module finds the simplest ones, each
+with its carrier (the empty cells it needs):
+  - bridges between two stones with two common empty neighbours
+  - edge template II: a stone on the second row with two empty cells below it
+  - edge template IIIa (the ziggurat, both mirror images): a stone on the
+    third row with its 8 cell carrier
+A color has decided the game if a chain of these connections with pairwise
+disjoint carriers joins its two edges, as the opponent can then only
+intrude in one carrier at a time.
+"""
+from .HexBoard import HexBoard
+
+# bridge offset -> the two cells of its carrier, the sum of two consecutive neighbour directions
+BRIDGES = {
+    (2, -1): ((1, 0), (1, -1)),
+    (1, -2): ((1, -1), (0, -1)),
+    (-1, -1): ((0, -1), (-1, 0)),
+    (-2, 1): ((-1, 0), (-1, 1)),
+    (-1, 2): ((-1, 1), (0, 1)),
+    (1, 1): ((0, 1), (1, 0)),
+}
+
+# edge templates of a blue stone at (row, y) towards the x = -1 edge, as (row, carrier offsets)
+TEMPLATES = [
+    (0, ()),
+    (1, ((-1, 0), (-1, 1))),
+    (2, ((0, 1), (-1, 0), (-1, 1), (-1, 2), (-2, 0), (-2, 1), (-2, 2), (-2, 3))),
+    (2, ((0, -1), (-1, -1), (-1, 0), (-1, 1), (-2, -1), (-2, 0), (-2, 1), (-2, 2))),
+]
+
+
+def _groups(board, color):
+    """returns {cell: group id} for the stones of color"""
+    group = {}
+    for cell, value in board.board.items():
+        if value != color or cell in group:
+            continue
+        group[cell] = cell
+        stack = [cell]
+        while stack:
+            for nb in board.get_neighbors(stack.pop()):
+                if nb not in group and board.board[nb] == color:
+                    group[nb] = cell
+                    stack.append(nb)
+    return group
+
+
+def _edge_transforms(size, color):
+    """the two symmetries of the board that map the edges of color onto the x = -1 edge of blue"""
+    if color == HexBoard.BLUE:
+        return [lambda c: c, lambda c: (size - 1 - c[0], size - 1 - c[1])]
+    return [lambda c: (c[1], c[0]), lambda c: (size - 1 - c[1], size - 1 - c[0])]
+
+
+def connections(board, color):
+    """
+    Returns:
+        links: {node: [(node, carrier), ...]} of the virtual connections of
+               color, where the nodes are group ids and the edges 0 and 1
+    """
+    size = board.size
+    group = _groups(board, color)
+    links = {0: [], 1: []}
+    links.update((g, []) for g in set(group.values()))
+
+    def link(a, b, carrier):
+        links[a].append((b, carrier))
+        links[b].append((a, carrier))
+
+    def empty(cell):
+        return 0 <= cell[0] < size and 0 <= cell[1] < size and board.board[cell] == HexBoard.EMPTY
+
+    for (x, y), g in group.items():
+        for (dx, dy), carrier in BRIDGES.items():
+            other = (x + dx, y + dy)
+            if group.get(other, g) != g and other > (x, y):
+                carrier = frozenset((x + cx, y + cy) for cx, cy in carrier)
+                if all(empty(c) for c in carrier):
+                    link(g, group[other], carrier)
+
+        for edge, transform in enumerate(_edge_transforms(size, color)):
+            tx, ty = transform((x, y)) # the transforms are their own inverse
+            for row, offsets in TEMPLATES:
+                if tx != row:
+                    continue
+                carrier = frozenset(transform((tx + cx, ty + cy)) for cx, cy in offsets)
+                if all(empty(c) for c in carrier):
+                    link(g, edge, carrier)
+    return links
+
+
+def is_connected(board, color, max_steps=10000):
+    """checks if color virtually connects its two edges (False when the search takes more than max_steps)"""
+    links = connections(board, color)
+    steps = [0]
+
+    def search(node, used, visited):
+        if node == 1:
+            return True
+        steps[0] += 1
+        if steps[0] > max_steps:
+            return False
+        for nxt, carrier in links[node]:
+            if nxt not in visited and not (carrier & used):
+                visited.add(nxt)
+                if search(nxt, used | carrier, visited):
+                    return True
+                visited.discard(nxt)
+        return False
+
+    return search(0, frozenset(), {0})
+
+
+def decided(board):
+    """returns the color that has already won board through virtual connections, or None"""
+    for color in (HexBoard.BLUE, HexBoard.RED):
+        if is_connected(board, color):
+            return color
+    return None
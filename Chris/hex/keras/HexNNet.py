@@ -7,26 +7,77 @@ from tensorflow.keras.models import *
 from tensorflow.keras.layers import *
 from tensorflow.keras.optimizers import *
 
+# named architectures: preset -> (builder method, args overriding the NNet args)
+PRESETS = {
+    'default': ('_build_default', {}),
+    'small': ('_build_default', {'num_channels': 64, 'fc_sizes': (256, 128)}),
+    'resnet_small': ('_build_resnet', {'num_channels': 64, 'num_res_blocks': 4}),
+    'fully_conv': ('_build_fully_conv', {'num_channels': 64, 'num_res_blocks': 4}),
+}
+
 class HexNNet():
     def __init__(self, game, args):
         # game params
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
-        self.args = args
+
+        arch = args.get('arch', 'default')
+        assert arch in PRESETS, f"arch must be in: {list(PRESETS)}"
+        builder, overrides = PRESETS[arch]
+        self.args = dotdict({**args, **overrides})
 
         # Neural Net
         self.input_boards = Input(shape=(self.board_x, self.board_y))    # s: batch_size x board_x x board_y
+        self.pi, self.v = getattr(self, builder)(self.args)
+
+        self.model = Model(inputs=self.input_boards, outputs=[self.pi, self.v])
+        self.model.compile(loss=['categorical_crossentropy','mean_squared_error'], optimizer=Adam(self.args.lr))
 
+    def _build_default(self, args):
+        # four conv layers followed by two dense layers shared by both heads
+        fc1, fc2 = args.get('fc_sizes', (1024, 512))
         x_image = Reshape((self.board_x, self.board_y, 1))(self.input_boards)                # batch_size  x board_x x board_y x 1
         h_conv1 = Activation('relu')(BatchNormalization(axis=3)(Conv2D(args.num_channels, 3, padding='same', use_bias=False)(x_image)))         # batch_size  x board_x x board_y x num_channels
         h_conv2 = Activation('relu')(BatchNormalization(axis=3)(Conv2D(args.num_channels, 3, padding='same', use_bias=False)(h_conv1)))         # batch_size  x board_x x board_y x num_channels
         h_conv3 = Activation('relu')(BatchNormalization(axis=3)(Conv2D(args.num_channels, 3, padding='valid', use_bias=False)(h_conv2)))        # batch_size  x (board_x-2) x (board_y-2) x num_channels
         h_conv4 = Activation('relu')(BatchNormalization(axis=3)(Conv2D(args.num_channels, 3, padding='valid', use_bias=False)(h_conv3)))        # batch_size  x (board_x-4) x (board_y-4) x num_channels
-        h_conv4_flat = Flatten()(h_conv4)       
-        s_fc1 = Dropout(args.dropout)(Activation('relu')(BatchNormalization(axis=1)(Dense(1024, use_bias=False)(h_conv4_flat))))  # batch_size x 1024
-        s_fc2 = Dropout(args.dropout)(Activation('relu')(BatchNormalization(axis=1)(Dense(512, use_bias=False)(s_fc1))))          # batch_size x 1024
-        self.pi = Dense(self.action_size, activation='softmax', name='pi')(s_fc2)   # batch_size x self.action_size
-        self.v = Dense(1, activation='tanh', name='v')(s_fc2)                    # batch_size x 1
+        h_conv4_flat = Flatten()(h_conv4)
+        s_fc1 = Dropout(args.dropout)(Activation('relu')(BatchNormalization(axis=1)(Dense(fc1, use_bias=False)(h_conv4_flat))))  # batch_size x 1024
+        s_fc2 = Dropout(args.dropout)(Activation('relu')(BatchNormalization(axis=1)(Dense(fc2, use_bias=False)(s_fc1))))          # batch_size x 1024
+        pi = Dense(self.action_size, activation='softmax', name='pi')(s_fc2)   # batch_size x self.action_size
+        v = Dense(1, activation='tanh', name='v')(s_fc2)                    # batch_size x 1
+        return pi, v
 
-        self.model = Model(inputs=self.input_boards, outputs=[self.pi, self.v])
-        self.model.compile(loss=['categorical_crossentropy','mean_squared_error'], optimizer=Adam(args.lr))
+    def _conv_bn(self, x, channels, kernel=3, relu=True):
+        x = BatchNormalization(axis=3)(Conv2D(channels, kernel, padding='same', use_bias=False)(x))
+        return Activation('relu')(x) if relu else x
+
+    def _res_tower(self, args):
+        # conv stem followed by num_res_blocks residual blocks, all board_x x board_y x num_channels
+        x = Reshape((self.board_x, self.board_y, 1))(self.input_boards)
+        x = self._conv_bn(x, args.num_channels)
+        for _ in range(args.num_res_blocks):
+            h = self._conv_bn(x, args.num_channels)
+            h = self._conv_bn(h, args.num_channels, relu=False)
+            x = Activation('relu')(Add()([x, h]))
+        return x
+
+    def _build_resnet(self, args):
+        # AlphaZero style heads on a residual tower
+        x = self._res_tower(args)
+        p = Flatten()(self._conv_bn(x, 2, kernel=1))
+        pi = Dense(self.action_size, activation='softmax', name='pi')(p)     # batch_size x self.action_size
+        h = Flatten()(self._conv_bn(x, 1, kernel=1))
+        h = Dense(64, activation='relu')(h)
+        v = Dense(1, activation='tanh', name='v')(h)                         # batch_size x 1
+        return pi, v
+
+    def _build_fully_conv(self, args):
+        # policy logits from a 1x1 conv per cell and value from global pooling, no dense layer depends on the board size
+        x = self._res_tower(args)
+        p = Flatten()(Conv2D(1, 1, padding='same')(x))                      # batch_size x self.action_size
+        pi = Activation('softmax', name='pi')(p)
+        h = GlobalAveragePooling2D()(self._conv_bn(x, 32, kernel=1))
+        h = Dense(32, activation='relu')(h)
+        v = Dense(1, activation='tanh', name='v')(h)                         # batch_size x 1
+        return pi, v
@@ -1,4 +1,5 @@
 import argparse
+import logging
 import os
 import shutil
 import time
@@ -11,8 +12,12 @@ from utils import *
 from NeuralNet import NeuralNet
 import tensorflow as tf
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 from .HexNNet import HexNNet as onnet
+from .QuantizedNNet import QuantizedNNet
+
+log = logging.getLogger(__name__)
 
 args = dotdict({
     'lr': 0.001,
@@ -21,6 +26,7 @@ args = dotdict({
     'batch_size': 64,
     'cuda': False,
     'num_channels': 512,
+    'arch': 'default',  # preset from HexNNet.PRESETS, see hex/keras/benchmark.py
 })
 
 class NNetWrapper(NeuralNet):
@@ -28,16 +34,23 @@ class NNetWrapper(NeuralNet):
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
+        self.writer = None  # background thread writing checkpoints, created on first save
+        self.pending = []   # checkpoint writes that have not finished yet
+        self.profiler = None  # optional Profiler for the time spent in predict
 
     def train(self, examples):
         """
-        examples: list of examples, each example is of form (board, pi, v)
+        examples: list of examples, each example is of form (board, pi, v) or
+                  (board, pi, v, isFullSearch); pi only counts in the loss if
+                  isFullSearch is true
         """
-        input_boards, target_pis, target_vs = list(zip(*examples))
-        input_boards = np.asarray(input_boards)
-        target_pis = np.asarray(target_pis)
-        target_vs = np.asarray(target_vs)
-        self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], batch_size = args.batch_size, epochs = args.epochs)
+        input_boards = np.asarray([e[0] for e in examples])
+        target_pis = np.asarray([e[1] for e in examples])
+        target_vs = np.asarray([e[2] for e in examples])
+        pi_weights = np.asarray([float(e[3]) if len(e) > 3 else 1. for e in examples])
+        v_weights = np.ones(len(examples))
+        self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], sample_weight = [pi_weights, v_weights],
+                            batch_size = args.batch_size, epochs = args.epochs)
 
     def predict(self, board):
         """
@@ -51,24 +64,92 @@ class NNetWrapper(NeuralNet):
 
         # run
         pi, v = self.nnet.model.predict(board)
+        if self.profiler is not None:
+            self.profiler.add('predict', time.time() - start)
 
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return pi[0], v[0]
 
-    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
-        filepath = os.path.join(folder, filename)
-        if not os.path.exists(folder):
-            print("Checkpoint Directory does not exist! Making directory {}".format(folder))
-            os.mkdir(folder)
-        else:
-            print("Checkpoint Directory exists! ")
-        self.nnet.model.save(filepath)
-        # self.nnet.model.save_weights("temp") #TODO not hardcode
+    def predict_batch(self, boards):
+        """
+        boards: list of np arrays with boards, evaluated in a single call
+        """
+        start = time.time()
+        pi, v = self.nnet.model.predict_on_batch(np.asarray(boards))
+        if self.profiler is not None:
+            self.profiler.add('predict_batch', time.time() - start)
+            self.profiler.count('predict_batch_boards', len(boards))
+        return pi, v
+
+    def quantize(self, boards):
+        """
+        Returns an int8 copy of the network for inference only, with the
+        activation ranges calibrated on boards.
+        """
+        return QuantizedNNet(self, boards)
+
+    def get_weights(self):
+        """
+        Returns an in-memory copy of the network weights.
+        """
+        return self.nnet.model.get_weights()
+
+    def set_weights(self, weights):
+        """
+        Replaces the network weights with weights from get_weights.
+        """
+        self.nnet.model.set_weights(weights)
+
+    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar', blocking=False):
+        """
+        Saves the weights to folder/filename.weights.npz. The weights are copied
+        right away and written by a background thread unless blocking is set,
+        so training can continue while the file is written. An earlier
+        background write that failed raises its error here.
+        """
+        filepath = os.path.join(folder, filename + '.weights.npz')
+        weights = self.get_weights()
+        if blocking:
+            self._write_weights(filepath, weights)
+            return
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(max_workers=1)  # one thread keeps the writes ordered
+        done = [f for f in self.pending if f.done()]
+        self.pending = [f for f in self.pending if f not in done]
+        for f in done:
+            f.result()  # raises if an earlier write failed
+        self.pending.append(self.writer.submit(self._write_weights, filepath, weights))
+
+    def wait_for_checkpoints(self):
+        """
+        Blocks until all background checkpoint writes are on disk.
+        """
+        for f in self.pending:
+            f.result()
+        self.pending = []
+
+    @staticmethod
+    def _write_weights(filepath, weights):
+        folder = os.path.dirname(filepath)
+        if folder and not os.path.exists(folder):
+            log.info(f"Checkpoint directory does not exist, making directory {folder}")
+            os.makedirs(folder, exist_ok=True)
+        tmppath = filepath + '.tmp'
+        with open(tmppath, 'wb') as f:
+            np.savez(f, *weights)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmppath, filepath)  # readers never see a half written checkpoint
 
     def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # https://github.com/pytorch/examples/blob/master/imagenet/main.py#L98
+        self.wait_for_checkpoints()
         filepath = os.path.join(folder, filename)
-        if not os.path.exists(filepath):
-            raise("No model in path {}".format(filepath))
-        self.nnet.model = tf.keras.models.load_model(filepath)
-        # self.nnet.model.load_weights("temp") #TODO not hardcode
+        if os.path.exists(filepath + '.weights.npz'):
+            with np.load(filepath + '.weights.npz') as data:
+                self.set_weights([data[f'arr_{i}'] for i in range(len(data.files))])
+        elif os.path.exists(filepath):
+            # full model saved by older versions
+            self.nnet.model = tf.keras.models.load_model(filepath)
+        else:
+            raise FileNotFoundError("No model in path {}".format(filepath))
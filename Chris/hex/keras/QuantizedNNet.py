@@ -0,0 +1,72 @@
+import numpy as np
+import tensorflow as tf
+
+
+class QuantizedNNet():
+    """
+    Post-training int8 copy of an NNetWrapper for CPU inference. Weights and
+    activations are quantized with ranges calibrated on a sample of boards.
+    It only implements predict, so it can be handed to MCTS in place of the
+    float network; training stays on the float NNetWrapper.
+    """
+
+    def __init__(self, nnet, boards, num_threads=None):
+        """
+        nnet: NNetWrapper to quantize
+        boards: sample of canonical boards (e.g. from the replay buffer) used to
+                calibrate the activation ranges
+        """
+        self.action_size = nnet.action_size
+        boards = np.asarray(boards, dtype=np.float32)
+
+        def representative_dataset():
+            for board in boards:
+                yield [board[np.newaxis, :, :]]
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(nnet.nnet.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]  # int8 kernels only, float in/out
+
+        self.interpreter = tf.lite.Interpreter(model_content=converter.convert(), num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        for output in self.interpreter.get_output_details():
+            if output['shape'][-1] == self.action_size:
+                self.pi_index = output['index']
+            else:
+                self.v_index = output['index']
+
+    def predict(self, board):
+        """
+        board: np array with board
+        """
+        self.interpreter.set_tensor(self.input_index, board[np.newaxis, :, :].astype(np.float32))
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.pi_index)[0], self.interpreter.get_tensor(self.v_index)[0]
+
+    def agreement(self, nnet, boards):
+        """
+        Compares the quantized outputs with the float network nnet on boards.
+
+        Returns:
+            report: dict with the top-1 policy agreement, mean KL divergence and
+                    max absolute difference of the policies, and the mean and max
+                    absolute error of the values
+        """
+        top1, kl, pi_err, v_err = [], [], [], []
+        for board in boards:
+            pi_f, v_f = nnet.predict(board)
+            pi_q, v_q = self.predict(board)
+            top1.append(np.argmax(pi_f) == np.argmax(pi_q))
+            kl.append(np.sum(pi_f * (np.log(pi_f + 1e-8) - np.log(pi_q + 1e-8))))
+            pi_err.append(np.max(np.abs(pi_f - pi_q)))
+            v_err.append(np.abs(v_f[0] - v_q[0]))
+        return {
+            'boards': len(boards),
+            'pi_top1_agreement': float(np.mean(top1)),
+            'pi_kl_mean': float(np.mean(kl)),
+            'pi_max_abs_err': float(np.max(pi_err)),
+            'v_mean_abs_err': float(np.mean(v_err)),
+            'v_max_abs_err': float(np.max(v_err)),
+        }
@@ -0,0 +1,77 @@
+"""
+Benchmark of the HexNNet presets: parameters, FLOPs per sample, and the
+latency of single-board predict (the path MCTS uses) and of batched
+inference, per board size.
+
+Usage (from the Chris folder):
+    python -m hex.keras.benchmark --sizes 5 7 9 --batch 64
+"""
+import argparse
+import time
+
+import numpy as np
+from tensorflow.keras.layers import Conv2D, Dense
+
+from ..HexGame import HexGame
+from .HexNNet import PRESETS
+from .NNet import NNetWrapper, args
+
+
+def count_flops(model):
+    """multiply-adds of the conv and dense layers for one sample, counted as 2 FLOPs"""
+    flops = 0
+    for layer in model.layers:
+        if isinstance(layer, Conv2D):
+            kh, kw = layer.kernel_size
+            cin = layer.input_shape[-1]
+            _, h, w, cout = layer.output_shape
+            flops += 2 * kh * kw * cin * cout * h * w
+        elif isinstance(layer, Dense):
+            flops += 2 * layer.input_shape[-1] * layer.units
+    return flops
+
+
+def time_it(fn, repeats):
+    """median wall time of fn() over repeats calls, after one warm-up call"""
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def benchmark(arch, n, batch_size=64, repeats=20):
+    args['arch'] = arch
+    game = HexGame(n)
+    nnet = NNetWrapper(game)
+    model = nnet.nnet.model
+    boards = np.random.choice([-1., 0., 1.], size=(batch_size, n, n))
+
+    single = time_it(lambda: nnet.predict(boards[0]), repeats)
+    batched = time_it(lambda: model.predict_on_batch(boards), repeats)
+    return {
+        'arch': arch,
+        'size': n,
+        'params': model.count_params(),
+        'flops': count_flops(model),
+        'single_ms': 1000 * single,
+        'batch_ms_per_board': 1000 * batched / batch_size,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the HexNNet presets")
+    parser.add_argument('--archs', nargs='+', default=list(PRESETS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[5, 7, 9])
+    parser.add_argument('--batch', type=int, default=64)
+    parser.add_argument('--repeats', type=int, default=20)
+    opts = parser.parse_args()
+
+    print(f"{'arch':>14} {'size':>4} {'params':>10} {'MFLOPs':>9} {'single ms':>10} {'batch ms/board':>15}")
+    for n in opts.sizes:
+        for arch in opts.archs:
+            r = benchmark(arch, n, opts.batch, opts.repeats)
+            print(f"{r['arch']:>14} {r['size']:>4} {r['params']:>10} {r['flops'] / 1e6:>9.2f} "
+                  f"{r['single_ms']:>10.2f} {r['batch_ms_per_board']:>15.3f}")
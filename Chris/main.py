@@ -4,6 +4,7 @@ import coloredlogs
 from Coach import Coach
 from hex.HexGame import HexGame as Game
 from hex.keras.NNet import NNetWrapper as nn
+from hex.keras.NNet import args as nnet_args
 from utils import *
 import sys
 
@@ -20,17 +21,45 @@ args = dotdict({
     'maxlenOfQueue': 200000,    # Number of game examples to train the neural networks.
     'numMCTSSims': 50,          # Number of games moves for MCTS to simulate.
     'arenaCompare': 40,         # Number of games to play during arena play to determine if new net will be accepted.
+    'arenaParallel': 1,         # Number of arena games played in lockstep with batched network evaluations (1 plays them one by one).
+    'evalModes': ['raw', 'mcts'], # Evaluations against a random player: raw policy, MCTS with evalMCTSSims, and/or full MCTS.
+    'evalGames': 100,           # Number of games per raw/mcts evaluation.
+    'evalMCTSSims': 10,         # Simulations per move in the mcts evaluation.
+    'evalParallel': 16,         # Number of evaluation games played at the same time.
+    'sprt': False,              # Stop the arena early with a sequential probability ratio test (arenaCompare becomes the maximum).
+    'sprtElo0': 0,              # Elo gain of the new network under H0 (reject).
+    'sprtElo1': None,           # Elo gain under H1 (accept), None for the elo of updateThreshold.
+    'sprtAlpha': 0.05,          # Probability of accepting a network that is not better.
+    'sprtBeta': 0.05,           # Probability of rejecting a network that is better.
     'cpuct': 1,
+    'pruneInferior': False,     # Leave dead and captured cells out of the MCTS moves (see hex/InferiorCells.py).
+    'vcTermination': False,     # End self-play and arena games once virtual connections decide them.
+    'solverMaxEmpty': None,     # Solve positions with at most this many empty cells exactly during MCTS (None never).
+    'solverBudget': 10000,      # Node budget of each proof-number search.
+    'playoutCap': False,        # Playout cap randomization: only some moves get a full search and a policy target.
+    'fullSearchProb': 0.25,     # Fraction of moves searched with numMCTSSims when playoutCap is on.
+    'fastMCTSSims': 10,         # Simulations of the other (fast) moves.
+    'resignThreshold': None,    # Resign when the MCTS root value drops below this, e.g. -0.9 (None never resigns).
+    'resignDisabledFrac': 0.1,  # Fraction of self-play games played out to measure false resignations.
+    'resignFalsePositiveTarget': 0.05, # Lower the resign threshold when more resignations than this are wrong.
+    'openingBook': None,        # Opening book file (see hex/OpeningBook.py) whose positions self-play takes from the book.
+    'quantizeSelfPlay': False,  # Run self-play with an int8 copy of the network (training and arena stay float).
+    'quantizeCalibrationSize': 256, # Number of replay boards used to calibrate the int8 network.
+
+    'profile': False,           # Time the MCTS and network steps of self-play.
+    'profileFile': 'profile.jsonl', # Per-move and per-iteration profile summaries, as JSON lines.
 
     'checkpoint': 'temp',
     'load_model': False,
     'load_folder_file': ('/dev/models/8x100x50','best.pth.tar'),
     'numItersForTrainExamplesHistory': 20,
+    'arch': 'default',          # Network preset (default, small, resnet_small, fully_conv), see hex/keras/benchmark.py.
 
 })
 
 if __name__ == "__main__":
     g = Game(7)
+    nnet_args['arch'] = args.arch
     nnet = nn(g)
 
     if args.load_model:
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from MCTS import MCTS
+from hex.HexGame import HexGame
+from utils import dotdict
+
+
+class UniformNet():
+    """stand-in network with a uniform policy and value 0"""
+    def __init__(self, game):
+        self.action_size = game.getActionSize()
+
+    def predict(self, board):
+        return np.ones(self.action_size) / self.action_size, np.zeros(1)
+
+
+@pytest.mark.parametrize("minSims", [None, 1, 2, 10])
+def test_timed_search(minSims):
+    game = HexGame(4)
+    args = dotdict({'numMCTSSims': 10, 'cpuct': 1, 'timeBudget': 0.2})
+    if minSims is not None:
+        args.minSims = minSims
+    board = game.getCanonicalForm(game.getInitBoard(), 1)
+    probs = MCTS(game, UniformNet(game), args).getActionProb(board, 1)
+    assert len(probs) == game.getActionSize()
+    assert np.isclose(sum(probs), 1)